@@ -0,0 +1,227 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import platform
+import argparse
+import numpy as np
+
+import headless
+import pygame
+
+import funs
+import catalog
+
+def Time_call(function, setup = None, min_time = 0.3, max_repeat = 100):
+    # Best of several runs (the least disturbed one); repeats stop after min_time in total
+    best, total, repeat = float('inf'), 0.0, 0
+    while repeat < max_repeat and (repeat < 5 or total < min_time):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best, total, repeat = min(best, elapsed), total + elapsed, repeat + 1
+        if elapsed > min_time:
+            break  # slow cases run once
+    return best
+
+class Results(dict):
+    # Benchmark name -> seconds; names not matching only (a regex) are skipped without running
+    def __init__(self, only = None):
+        super().__init__()
+        self.only = only
+
+    def wanted(self, *names):
+        return self.only is None or any(re.search(self.only, name) for name in names)
+
+    def time(self, name, function, setup = None):
+        if self.wanted(name):
+            self[name] = Time_call(function, setup)
+
+def Stored_curves(db_path):
+    # (ID, className) of every curve in the database
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("SELECT ID, className FROM curves ORDER BY ID").fetchall()
+    finally:
+        connection.close()
+
+def Unstored_classes(db_path):
+    # Curve classes of funs without a row in the database: slider ranges and defaults come from
+    # the stored rows, so the calculate and ode benchmarks cover only the stored classes
+    stored = {className for curve_id, className in Stored_curves(db_path)}
+    return sorted(name for name, value in vars(funs).items()
+                  if isinstance(value, type) and issubclass(value, funs.Curve) and value.param_map and name not in stored)
+
+def Uncached(db_path, curve_id):
+    # A stored curve whose calculate() always computes
+    record, curve = catalog.Load_curve(db_path, curve_id)
+    curve.result_cache = None
+    return curve
+
+def Bench_calculate(results, db_path, sizes):
+    # calculate() of each stored curve class from scratch, for every number of points
+    for curve_id, className in Stored_curves(db_path):
+        if not results.wanted(*(f"calculate/{className}/{size}" for size in sizes)):
+            continue
+        curve = Uncached(db_path, curve_id)
+        Npoints = curve.Npoints
+        for size in sizes:
+            curve.Npoints = size
+            def run():
+                curve.reset_state()
+                curve.calculate()
+            results.time(f"calculate/{className}/{size}", run)
+        curve.Npoints = Npoints
+
+def Bench_stepping(results, db_path, steps = 200):
+    # Full solve against t slider stepping (per step) of the ODE curves
+    for curve_id, className in Stored_curves(db_path):
+        if className not in ('LorenzSys', 'SIR', 'Newton2D') or not results.wanted(f"ode/{className}/full", f"ode/{className}/step"):
+            continue
+        curve = Uncached(db_path, curve_id)
+        def full():
+            curve.reset_state()
+            curve.calculate()
+        results.time(f"ode/{className}/full", full)
+
+        if curve.dense_output:
+            def start():
+                curve.reset_state()
+                curve.t = curve.tmin + curve.tincr
+                curve.calculate()
+            def step():
+                for k in range(steps):
+                    curve.t += curve.tincr
+                    curve.calculate()
+        else:
+            def start():
+                curve.reset_state()
+                curve.calculate()
+            def step():
+                for k in range(steps):
+                    curve.calculate(curve.tincr)
+        if results.wanted(f"ode/{className}/step"):
+            results[f"ode/{className}/step"] = Time_call(step, start)/steps
+
+def Bench_screen_coords(results, sizes):
+    if not results.wanted(*(f"screen_coords/{size}" for size in sizes)):
+        return
+    area = headless.HeadlessRenderer(1000, 1000).window.Areas[1]
+    for size in sizes:
+        points = np.random.default_rng(0).normal(size=(size, 2))
+        results.time(f"screen_coords/{size}", lambda: area.get_screen_coords(points))
+
+def Bench_grids(results):
+    if not results.wanted("grids/make", "grids/recalculate"):
+        return
+    area = headless.HeadlessRenderer(1000, 1000).window.Areas[1]
+    results.time("grids/make", area.make_grids)
+    results.time("grids/recalculate", area.recalculate_grids)
+
+def Bench_draw(results, db_path):
+    # One stored curve per area; warm redraws reuse the background layer, cold ones rebuild it
+    stored = dict((className, curve_id) for curve_id, className in Stored_curves(db_path))
+    shown  = [stored[className] for className in ('RoseSin', 'Oscillator', 'LorenzSys', 'Ellipse') if className in stored]
+    if not shown:
+        print(f"draw/*: {db_path} has none of RoseSin, Oscillator, LorenzSys, Ellipse, skipped", file=sys.stderr)
+        return
+    for style in range(1, 5):
+        if not results.wanted(f"draw/{style}areas/warm", f"draw/{style}areas/cold"):
+            continue
+        renderer = headless.HeadlessRenderer(1000, 1000, style)
+        for area_id in range(1, style + 1):
+            record, curve = catalog.Load_curve(db_path, shown[(area_id - 1) % len(shown)])
+            renderer.add_curve(curve, area_id, uniform=not record.scale)
+        areas = renderer.window.Areas.values()
+        def warm():
+            for area in areas:
+                area.invalidate()
+            renderer.render()
+        def cold():
+            for area in areas:
+                area.background = None
+            warm()
+        results.time(f"draw/{style}areas/warm", warm)
+        results.time(f"draw/{style}areas/cold", cold)
+        renderer.close()
+
+def Bench_db(results, db_path):
+    # What a double click in the curve list does: the JOIN query, and building the curve from the
+    # rows kept by the catalog (first calculate included, so the result cache is left out)
+    stored = catalog.Open(db_path)
+    result_cache, funs.Curve.result_cache = funs.Curve.result_cache, None
+    try:
+        for curve_id, className in Stored_curves(db_path):
+            results.time(f"db/read/{className}", lambda: stored.query(curve_id))
+            results.time(f"db/load/{className}", lambda: stored.load_curve(curve_id))
+    finally:
+        funs.Curve.result_cache = result_cache
+
+def Compare(results, baseline, tolerance, min_delta = 0.0):
+    # Ratio current/baseline of every benchmark both have; above 1 + tolerance is a regression,
+    # unless the difference is under min_delta seconds (timer noise of the fastest cases)
+    comparison, regressions = {}, []
+    for name, seconds in results.items():
+        if name in baseline:
+            ratio = seconds/baseline[name] if baseline[name] > 0 else float('inf')
+            comparison[name] = {'baseline': baseline[name], 'current': seconds, 'ratio': round(ratio, 3)}
+            if ratio > 1 + tolerance and seconds - baseline[name] > min_delta:
+                regressions.append(name)
+    return comparison, regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Time curve evaluation, ODE integration, rendering and DB loading, compared with a stored baseline. "
+                                                 "Curve classes are benchmarked through their rows in the database; classes without one are listed and skipped.")
+    parser.add_argument('--db', default='curves.db')
+    parser.add_argument('--baseline', default='bench_baseline.json', help="results of an earlier run to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before a benchmark counts as regressed")
+    parser.add_argument('--min-delta', type=float, default=1e-4, help="slowdowns smaller than this many seconds are ignored")
+    parser.add_argument('--max-points', type=int, default=10**6)
+    parser.add_argument('--only', metavar='REGEX', help="run only the benchmarks whose name matches")
+    parser.add_argument('--out', help="JSON file for the report, stdout by default")
+    args = parser.parse_args(argv)
+
+    sizes = [10**k for k in range(2, 7) if 10**k <= args.max_points]
+    results = Results(args.only)
+    unstored = Unstored_classes(args.db)
+    if unstored:
+        print(f"Not in {args.db}, so not benchmarked: {', '.join(unstored)}", file=sys.stderr)
+    Bench_calculate(results, args.db, sizes)
+    Bench_stepping(results, args.db)
+    Bench_screen_coords(results, sizes)
+    Bench_grids(results)
+    Bench_draw(results, args.db)
+    Bench_db(results, args.db)
+
+    report = {'meta': {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'numpy': np.__version__,
+                       'machine': platform.machine(), 'cpus': os.cpu_count()},
+              'results': results}
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+        report['baseline_meta'] = baseline.get('meta')
+        report['comparison'], regressions = Compare(results, baseline['results'], args.tolerance, args.min_delta)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fp:
+            fp.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fp:
+            json.dump({'meta': report['meta'], 'results': results}, fp, indent=2)
+    for name in regressions:
+        print(f"Regression: {name} {report['comparison'][name]['ratio']:.2f}x the baseline", file=sys.stderr)
+    pygame.quit()
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
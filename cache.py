@@ -0,0 +1,155 @@
+import os
+import shutil
+import hashlib
+import threading
+import numpy as np
+
+from collections import OrderedDict
+
+def Freeze(value):
+    # Hashable form of parameter values; floats are rounded so that a slider coming back
+    # to a value through accumulated steps (0.1+0.2-0.2) still finds its result
+    if isinstance(value, np.ndarray):
+        return (value.shape, value.tobytes())
+    if isinstance(value, dict):
+        return tuple(sorted((key, Freeze(val)) for key, val in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(Freeze(val) for val in value)
+    if isinstance(value, (float, np.floating)):
+        return float(f"{value:.12g}")
+    return value
+
+class ResultCache:
+    # Computed curve arrays by parameter key, least recently used ones go first once over budget
+    def __init__(self, max_bytes = 256*1024*1024):
+        self.max_bytes = max_bytes
+        self.entries   = OrderedDict()  # key -> (nbytes, {attribute name: array})
+        self.nbytes    = 0
+        self.hits      = 0
+        self.misses    = 0
+        self.lock      = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, arrays):
+        # Stored arrays are made read-only, so a hit can hand them out without copying
+        for array in arrays.values():
+            array.setflags(write=False)
+        size = sum(array.nbytes for array in arrays.values())
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[0]
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (size, arrays)
+            self.nbytes += size
+            self.evict()
+
+    def evict(self):
+        while self.nbytes > self.max_bytes:
+            size, arrays = self.entries.popitem(last=False)[1]
+            self.nbytes -= size
+
+    def set_budget(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+class TrajectoryStore:
+    # Computed arrays kept on disk across sessions, one directory of .npy files per key. They are
+    # mapped back read-only (no copy, pages are read on first touch); least recently used
+    # entries are deleted once the directory grows over max_bytes
+    def __init__(self, directory, max_bytes = 2*1024*1024*1024, min_seconds = 0.05):
+        self.directory   = directory
+        self.max_bytes   = max_bytes
+        self.min_seconds = min_seconds  # quicker computations are not worth a disk write
+        self.lock        = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.sizes = {}                 # entry name -> bytes, filled from the directory on first use
+        self.nbytes = None
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            arrays = {name[:-4]: np.load(os.path.join(path, name), mmap_mode='r') for name in os.listdir(path) if name.endswith('.npy')}
+            os.utime(path)  # the modification time orders the entries for eviction
+        except (FileNotFoundError, ValueError, OSError):
+            return None     # missing, or deleted by another session while being read
+        return arrays or None
+
+    def put(self, key, arrays):
+        # Written into a temporary directory renamed into place, so readers never see half an entry
+        path = self.entry_path(key)
+        if os.path.isdir(path):
+            return
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(temporary, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary, name + '.npy'), np.asarray(array, dtype=float))
+        size = sum(os.path.getsize(os.path.join(temporary, name)) for name in os.listdir(temporary))
+        with self.lock:
+            self.scan()  # before the new entry is in the directory, it is counted below
+        try:
+            os.rename(temporary, path)
+        except OSError:
+            shutil.rmtree(temporary, ignore_errors=True)  # written by another thread meanwhile
+            return
+        with self.lock:
+            self.sizes[os.path.basename(path)] = size
+            self.nbytes += size
+            self.evict()
+
+    def scan(self):
+        # Called with the lock held
+        if self.nbytes is not None:
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and not name.endswith('.tmp'):
+                self.sizes[name] = sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+        self.nbytes = sum(self.sizes.values())
+
+    def evict(self):
+        # Called with the lock held; mapped arrays of deleted entries stay valid (POSIX)
+        if self.nbytes <= self.max_bytes:
+            return
+        ages = {}
+        for name in self.sizes:
+            try:
+                ages[name] = os.path.getmtime(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                ages[name] = 0.0
+        for name in sorted(self.sizes, key=ages.get):
+            if self.nbytes <= self.max_bytes:
+                break
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            self.nbytes -= self.sizes.pop(name)
+
+    def clear(self):
+        with self.lock:
+            self.scan()
+            for name in list(self.sizes):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            self.sizes, self.nbytes = {}, 0
+
+results = ResultCache()  # shared by all curves, so every area showing a curve reuses its results
@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import urllib.parse
+import threading
+
+from collections import namedtuple
+
+import funs
+
+CurveRecord = namedtuple('CurveRecord', ['ID', 'name', 'className', 'color', 'thickness', 'parametric', 'formula', 'radians', 'also3d', 'scale'])
+ParamRecord = namedtuple('ParamRecord', ['param', 'type', 'magnitude', 'valMin', 'valMax', 'val0', 'incr', 'Npoints'])
+# The whole catalog without formula images: ID -> (CurveRecord, [ParamRecord]), (ID, name) list, className -> [ID]
+CatalogSnapshot = namedtuple('CatalogSnapshot', ['curves', 'listing', 'by_class', 'stamp'])
+
+# Constant statements with ? placeholders: sqlite3 keeps them prepared in the statement cache of the connection
+COLUMNS_SQL  = ("c.ID, c.name, c.className, c.color, c.thickness, c.parametric, {formula}, c.radians, c.also3d, c.scale, "
+                "p.param, p.type, p.magnitude, p.valMin, p.valMax, p.val0, p.incr, p.Npoints")
+SNAPSHOT_SQL = "SELECT " + COLUMNS_SQL.format(formula="NULL") + " FROM curves AS c LEFT JOIN params AS p ON p.curve_id = c.ID ORDER BY c.ID, p.ID;"
+CURVE_SQL    = "SELECT " + COLUMNS_SQL.format(formula="c.formula") + " FROM curves AS c LEFT JOIN params AS p ON p.curve_id = c.ID WHERE c.ID=? ORDER BY p.ID;"
+FORMULA_SQL  = "SELECT formula FROM curves WHERE ID=?;"
+
+def Group_rows(rows):
+    # Rows of the curves/params JOIN as ID -> (CurveRecord, [ParamRecord]), in row order
+    curves = {}
+    for row in rows:
+        if row[0] not in curves:
+            curves[row[0]] = (CurveRecord(*row[:10]), [])
+        if row[10] is not None:
+            curves[row[0]][1].append(ParamRecord(*row[10:]))
+    return curves
+
+class Catalog:
+    # One long-lived, read-only connection to a curve database. The whole catalog but the formula
+    # images is held in memory and read again only when the database has changed
+    def __init__(self, db_path):
+        self.db_path    = db_path
+        self.lock       = threading.Lock()
+        self.connection = None
+        self.snapshot   = None
+        self.connect()
+
+    def connect(self):
+        # Called with the lock held (or from __init__)
+        if self.connection is not None:
+            self.connection.close()
+        # Read-only, in the journal mode of the file: the reader never rewrites the database
+        self.check_leftovers()
+        uri = "file:" + urllib.parse.quote(os.path.abspath(self.db_path)) + "?mode=ro"
+        self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.connection.execute("PRAGMA query_only=ON;")
+        self.file_stamp = self.get_file_stamp()
+
+    def check_leftovers(self):
+        # SQLite replays any -wal file found next to a database. One beside a file in rollback
+        # journal mode was left by an earlier file at that path (replaced by a copy or a checkout)
+        # and would show that file's changes in this one
+        with open(self.db_path, 'rb') as fp:
+            header = fp.read(20)
+        wal_path = self.db_path + '-wal'
+        if len(header) == 20 and header[18] == 1 and os.path.exists(wal_path) and os.path.getsize(wal_path) > 0:
+            raise sqlite3.DatabaseError(f"{wal_path} does not belong to {self.db_path} (not in WAL mode); remove it and its -shm file")
+
+    def get_file_stamp(self):
+        # Changes when the database file is replaced or written by something bypassing SQLite's counters
+        stamps = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def get_snapshot(self):
+        # Reloads when another connection committed (data_version) or the file changed (mtime)
+        with self.lock:
+            file_stamp = self.get_file_stamp()
+            if file_stamp[0] and self.file_stamp[0] and file_stamp[0][0] != self.file_stamp[0][0]:
+                self.connect()  # a new file at the path, the connection still reads the old one
+            data_version = self.connection.execute("PRAGMA data_version;").fetchone()[0]
+            stamp = (data_version, file_stamp)
+            if self.snapshot is None or self.snapshot.stamp != stamp:
+                curves   = Group_rows(self.connection.execute(SNAPSHOT_SQL).fetchall())
+                listing  = [(curve_id, record.name) for curve_id, (record, params) in curves.items()]
+                by_class = {}
+                for curve_id, (record, params) in curves.items():
+                    by_class.setdefault(record.className, []).append(curve_id)
+                self.snapshot = CatalogSnapshot(curves, listing, by_class, stamp)
+            return self.snapshot
+
+    def list_curves(self):
+        # (ID, name) of all curves
+        return self.get_snapshot().listing
+
+    def find(self, className):
+        # IDs of the curves of a class
+        return self.get_snapshot().by_class.get(className, [])
+
+    def read(self, curve_id):
+        # (CurveRecord, [ParamRecord]) without the formula image, None for an unknown ID
+        return self.get_snapshot().curves.get(curve_id)
+
+    def read_curve(self, curve_id):
+        # (CurveRecord, inpParams) of a curve, or (None, None)
+        stored = self.read(curve_id)
+        if stored is None:
+            return None, None
+        record, params = stored
+        return record, Input_params(params, record.radians)
+
+    def query(self, curve_id):
+        # (CurveRecord, [ParamRecord]) with the formula, straight from the database
+        with self.lock:
+            rows = self.connection.execute(CURVE_SQL, (curve_id,)).fetchall()
+        return Group_rows(rows).get(curve_id)
+
+    def formula(self, curve_id):
+        # PNG bytes of the formula image, None when there is none
+        with self.lock:
+            row = self.connection.execute(FORMULA_SQL, (curve_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def load_curve(self, curve_id, formula = ""):
+        # (record, curve) of a stored curve, for use without the UI
+        record, params = self.read_curve(curve_id)
+        if record is None:
+            raise ValueError(f"No curve with ID {curve_id} in {self.db_path}")
+        curve = Create_curve(record, params, formula)
+        if curve is None:
+            raise ValueError(f"Class {record.className} not found in module 'funs'.")
+        return record, curve
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+def Input_params(params, t_in_radians):
+    # Slider settings in the form the Curve classes take as inpParams:
+    # [defMin, defMax, actMin, actMax, actVal, incr, Npoints]
+    gotParams = {}
+    for paramSet in params:
+        magnitude = float(paramSet.magnitude)
+        if paramSet.param == 't' and t_in_radians: magnitude *= 3.14159265358979323846
+
+        if paramSet.type == 1:
+          defMin = 0.0
+        else:
+          defMin = -magnitude
+        defMax = magnitude
+
+        actMin = defMin*paramSet.valMin
+        actMax = defMax*paramSet.valMax
+        actVal = paramSet.val0
+
+        gotParams[paramSet.param] = [defMin, defMax, actMin, actMax, actVal, paramSet.incr, paramSet.Npoints]
+    return gotParams
+
+def Create_curve(record, params, formula = ""):
+    # None when funs has no class of that name
+    if not hasattr(funs, record.className):
+        return None
+    curveClass = getattr(funs, record.className)  # Get the class by name
+    return curveClass(name=record.name, color=record.color, thickness=record.thickness, is_parametric=int(record.parametric), formula=formula, inpParams=params)
+
+catalogs = {}  # db path -> Catalog shared by everything reading that database
+catalogs_lock = threading.Lock()
+
+def Open(db_path):
+    with catalogs_lock:
+        if db_path not in catalogs:
+            catalogs[db_path] = Catalog(db_path)
+        return catalogs[db_path]
+
+def Load_curve(db_path, curve_id):
+    return Open(db_path).load_curve(curve_id)
@@ -0,0 +1,231 @@
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import argparse
+
+import funs
+import catalog
+
+# Schema of curves.db, used when the target database is new
+SCHEMA_SQL = [
+    '''CREATE TABLE IF NOT EXISTS "params" (
+	"ID"	INTEGER NOT NULL,
+	"curve_id"	INTEGER NOT NULL DEFAULT 1,
+	"param"	TEXT NOT NULL DEFAULT 't',
+	"type"	INTEGER NOT NULL DEFAULT 1,
+	"magnitude"	REAL NOT NULL DEFAULT 1.0,
+	"valMin"	REAL NOT NULL DEFAULT 0.0,
+	"valMax"	REAL NOT NULL DEFAULT 1.0,
+	"val0"	INTEGER NOT NULL DEFAULT 1.0,
+	"incr"	REAL NOT NULL DEFAULT 1.0,
+	"Npoints"	INTEGER NOT NULL DEFAULT 10,
+	PRIMARY KEY("ID")
+)''',
+    '''CREATE TABLE IF NOT EXISTS "curves" (
+	"ID"	INTEGER NOT NULL,
+	"name"	TEXT NOT NULL DEFAULT 'some',
+	"color"	TEXT NOT NULL DEFAULT 'black',
+	"thickness"	INTEGER NOT NULL DEFAULT 1,
+	"className"	TEXT NOT NULL DEFAULT 'some',
+	"parametric"	NUMERIC DEFAULT 0,
+	"formula"	BLOB,
+	"radians"	INTEGER DEFAULT 0,
+	"also3d"	INTEGER DEFAULT 0,
+	"scale"	INTEGER NOT NULL DEFAULT 0,
+	PRIMARY KEY("ID")
+)''',
+    'CREATE INDEX IF NOT EXISTS "params_curve_id" ON "params" ("curve_id")',
+]
+
+CURVE_FIELDS = list(catalog.CurveRecord._fields)
+PARAM_FIELDS = list(catalog.ParamRecord._fields)
+INTEGER_FIELDS = {'ID', 'thickness', 'parametric', 'radians', 'also3d', 'scale', 'type', 'Npoints'}
+
+INSERT_CURVE_SQL = f"INSERT OR REPLACE INTO curves ({', '.join(CURVE_FIELDS)}) VALUES ({', '.join('?'*len(CURVE_FIELDS))});"
+INSERT_PARAM_SQL = f"INSERT INTO params (curve_id, {', '.join(PARAM_FIELDS)}) VALUES (?, {', '.join('?'*len(PARAM_FIELDS))});"
+DELETE_PARAMS_SQL = "DELETE FROM params WHERE curve_id=?;"
+EXPORT_SQL = "SELECT " + catalog.COLUMNS_SQL.format(formula="c.formula") + " FROM curves AS c LEFT JOIN params AS p ON p.curve_id = c.ID ORDER BY c.ID, p.ID;"
+
+def Number(text, field):
+    # CSV cells are text; integers stay integers, so a round trip gives back the same values
+    if field in INTEGER_FIELDS:
+        return int(float(text))
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+def Read_json(path):
+    with open(path, encoding='utf-8') as fp:
+        return json.load(fp)['curves']
+
+def Write_json(path, curves):
+    with open(path, 'w', encoding='utf-8') as fp:
+        json.dump({'curves': curves}, fp, ensure_ascii=False, indent=1)
+
+def Read_csv(curves_path, params_path):
+    # curves.csv has a row per curve, params.csv a row per parameter with its curve_id
+    curves = []
+    with open(curves_path, newline='', encoding='utf-8') as fp:
+        for row in csv.DictReader(fp):
+            curve = {field: row[field] for field in ('name', 'color', 'className')}
+            for field in ('ID', 'thickness', 'parametric', 'radians', 'also3d', 'scale'):
+                curve[field] = Number(row[field], field)
+            curve['formula'] = row['formula'] or None
+            curve['params']  = []
+            curves.append(curve)
+    by_id = {curve['ID']: curve for curve in curves}
+    with open(params_path, newline='', encoding='utf-8') as fp:
+        for row in csv.DictReader(fp):
+            param = {field: row[field] if field == 'param' else Number(row[field], field) for field in PARAM_FIELDS}
+            curve_id = int(row['curve_id'])
+            if curve_id not in by_id:
+                raise ValueError(f"{params_path}: parameter {param['param']} of unknown curve {curve_id}")
+            by_id[curve_id]['params'].append(param)
+    return curves
+
+def Write_csv(curves_path, params_path, curves):
+    with open(curves_path, 'w', newline='', encoding='utf-8') as fp:
+        writer = csv.DictWriter(fp, CURVE_FIELDS)
+        writer.writeheader()
+        writer.writerows({field: curve[field] for field in CURVE_FIELDS} for curve in curves)
+    with open(params_path, 'w', newline='', encoding='utf-8') as fp:
+        writer = csv.DictWriter(fp, ['curve_id'] + PARAM_FIELDS)
+        writer.writeheader()
+        writer.writerows(dict(param, curve_id=curve['ID']) for curve in curves for param in curve['params'])
+
+def Read_definitions(src):
+    # A directory with curves.json, or with curves.csv and params.csv
+    if os.path.exists(os.path.join(src, 'curves.json')):
+        return Read_json(os.path.join(src, 'curves.json'))
+    return Read_csv(os.path.join(src, 'curves.csv'), os.path.join(src, 'params.csv'))
+
+def Validate(curves, src):
+    # Messages for everything that would make a curve fail to load; empty when all is fine
+    errors = []
+    seen = set()
+    for curve in curves:
+        label = f"curve {curve.get('ID')} ({curve.get('name')})"
+        missing = [field for field in CURVE_FIELDS if field not in curve]
+        if missing:
+            errors.append(f"{label}: missing {', '.join(missing)}")
+            continue
+        if curve['ID'] in seen:
+            errors.append(f"{label}: duplicate ID")
+        seen.add(curve['ID'])
+
+        curveClass = getattr(funs, curve['className'], None)
+        if not isinstance(curveClass, type) or not issubclass(curveClass, funs.Curve):
+            errors.append(f"{label}: class {curve['className']} not found in module 'funs'")
+            continue
+        names = [param.get('param') for param in curve.get('params', [])]
+        for name in sorted(set(name for name in names if names.count(name) > 1)):
+            errors.append(f"{label}: parameter {name} given more than once")
+        for name in names:
+            if name != 't' and name not in curveClass.param_map:
+                errors.append(f"{label}: {curve['className']} has no parameter {name}")
+        for name in curveClass.param_map:
+            if name not in names:
+                errors.append(f"{label}: parameter {name} of {curve['className']} is missing")
+        for param in curve.get('params', []):
+            missing = [field for field in PARAM_FIELDS if field not in param]
+            if missing:
+                errors.append(f"{label}: parameter {param.get('param')} without {', '.join(missing)}")
+        if curve['formula'] and not os.path.isfile(os.path.join(src, curve['formula'])):
+            errors.append(f"{label}: formula image {curve['formula']} not found")
+    return errors
+
+def Export_catalog(db_path, dst, file_format = 'json'):
+    # Definitions of all curves into dst, formula images as formulas/<ID>.png
+    os.makedirs(os.path.join(dst, 'formulas'), exist_ok=True)
+    connection = sqlite3.connect(db_path)
+    try:
+        rows = connection.execute(EXPORT_SQL).fetchall()
+    finally:
+        connection.close()
+    curves = []
+    for record, params in catalog.Group_rows(rows).values():
+        curve = record._asdict()
+        if record.formula:
+            curve['formula'] = f"formulas/{record.ID}.png"
+            with open(os.path.join(dst, curve['formula']), 'wb') as fp:
+                fp.write(record.formula)
+        curve['params'] = [param._asdict() for param in params]
+        curves.append(curve)
+    if file_format == 'json':
+        Write_json(os.path.join(dst, 'curves.json'), curves)
+    else:
+        Write_csv(os.path.join(dst, 'curves.csv'), os.path.join(dst, 'params.csv'), curves)
+    return len(curves)
+
+def Import_catalog(db_path, curves, src, replace = False):
+    # One transaction: all definitions go in or none does. Curves replace stored ones with the
+    # same ID (their params included); replace empties both tables first
+    curve_rows, param_rows = [], []
+    for curve in curves:
+        formula = None
+        if curve['formula']:
+            with open(os.path.join(src, curve['formula']), 'rb') as fp:
+                formula = fp.read()
+        curve_rows.append([formula if field == 'formula' else curve[field] for field in CURVE_FIELDS])
+        param_rows += [[curve['ID']] + [param[field] for field in PARAM_FIELDS] for param in curve.get('params', [])]
+
+    connection = sqlite3.connect(db_path)
+    try:
+        with connection:
+            for statement in SCHEMA_SQL:
+                connection.execute(statement)
+            if replace:
+                connection.execute("DELETE FROM params;")
+                connection.execute("DELETE FROM curves;")
+            else:
+                connection.executemany(DELETE_PARAMS_SQL, [(row[0],) for row in curve_rows])
+            connection.executemany(INSERT_CURVE_SQL, curve_rows)
+            connection.executemany(INSERT_PARAM_SQL, param_rows)
+    finally:
+        connection.close()
+    return len(curve_rows), len(param_rows)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Import and export the curve catalog (curves and params tables).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    exporting = commands.add_parser('export', help="write the database into a directory of definitions")
+    exporting.add_argument('dst')
+    exporting.add_argument('--db', default='curves.db')
+    exporting.add_argument('--format', choices=['json', 'csv'], default='json')
+
+    importing = commands.add_parser('import', help="load a directory of definitions into the database")
+    importing.add_argument('src')
+    importing.add_argument('--db', default='curves.db')
+    importing.add_argument('--replace', action='store_true', help="drop all stored curves first")
+
+    checking = commands.add_parser('validate', help="check a directory of definitions without importing it")
+    checking.add_argument('src')
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    if args.command == 'export':
+        count = Export_catalog(args.db, args.dst, args.format)
+        print(f"{count} curves exported to {args.dst} in {time.time() - started:.2f} s")
+        return 0
+
+    curves = Read_definitions(args.src)
+    errors = Validate(curves, args.src)
+    for error in errors:
+        print(error)
+    if errors:
+        print(f"{len(errors)} problems in {args.src}, nothing imported")
+        return 1
+    if args.command == 'import':
+        Ncurves, Nparams = Import_catalog(args.db, curves, args.src, args.replace)
+        print(f"{Ncurves} curves and {Nparams} params imported into {args.db} in {time.time() - started:.2f} s")
+    else:
+        print(f"{len(curves)} curves are valid")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import multiprocessing
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+
+import funs
+
+class Precomputer:
+    # Speculatively computes the parameter values a slider is about to take into the result cache
+    def __init__(self, max_workers = 2, lookahead = 4):
+        self.executor  = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='precompute')
+        self.lookahead = lookahead
+        self.futures   = {}  # (curve, param) -> {cache key: future} of the last request
+        self.lock      = threading.Lock()
+
+    def prefetch(self, curve, param, values):
+        if not curve.precomputable():
+            return
+        twins = {}
+        for val in values:
+            twin = curve.spawn()
+            twin.set_param(param, val)
+            twins[twin.cache_key()] = twin
+
+        with self.lock:
+            # Values no longer ahead of the slider (direction changed) are dropped if not started yet
+            previous = self.futures.get((curve, param), {})
+            for key, future in previous.items():
+                if key not in twins:
+                    future.cancel()
+            running = {key: future for key, future in previous.items() if key in twins and not future.done()}
+            for key, twin in twins.items():
+                if key not in running and key not in curve.result_cache:
+                    running[key] = self.executor.submit(self.compute, twin)
+            self.futures[(curve, param)] = running
+
+    def wait(self, curve, param, key):
+        # Blocks until a prefetch of key for (curve, param) has finished, if one was started
+        with self.lock:
+            future = self.futures.get((curve, param), {}).get(key)
+        if future is not None:
+            wait([future])
+
+    def compute(self, twin):
+        try:
+            twin.calculate()
+        except Exception as e:
+            print(f"Precomputing {twin.name} failed: {e}")
+
+    def ahead(self, value, step, direction, min_value, max_value):
+        # Next values of an animation moving in direction (+1/-1), or both neighbours when idle
+        if direction:
+            candidates = [value + direction*step*k for k in range(1, self.lookahead + 1)]
+        else:
+            candidates = [value - step, value + step]
+        return [val for val in candidates if min_value < val < max_value]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class Scheduler:
+    # Runs curve recalculations off the Tk thread: one job per curve at a time, and requests
+    # arriving meanwhile are merged so that only the newest value of each parameter is computed
+    def __init__(self, max_workers = 4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scheduler')
+        self.pending  = {}     # curve -> merged request waiting for the running job to finish
+        self.running  = set()
+        self.lock     = threading.Lock()
+
+    def submit(self, curve, param, value, increment = 0.0):
+        with self.lock:
+            request = self.pending.setdefault(curve, {'params': {}, 'recalc': False, 'steps': 0, 'increment': 0.0})
+            request['params'][param] = value
+            if increment:
+                # t steps extend the trajectory, so they are counted rather than merged
+                request['steps'] += 1
+                request['increment'] = increment
+            else:
+                # A recalculation starts the trajectory over: steps posted before it are dropped,
+                # as they would be when run one by one
+                request['recalc'] = True
+                request['steps'], request['increment'] = 0, 0.0
+            if curve not in self.running:
+                self.start(curve)
+
+    def start(self, curve):
+        # Called with the lock held
+        request = self.pending.pop(curve)
+        self.running.add(curve)
+        self.executor.submit(self.run, curve, request)
+
+    def run(self, curve, request):
+        try:
+            twin = curve.spawn()
+            for param, value in request['params'].items():
+                twin.set_param(param, value)
+            if request['recalc']:
+                twin.calculate(0.0)
+            for step in range(request['steps']):
+                twin.calculate(request['increment'])
+            curve.publish(twin)
+        except Exception as e:
+            curve.reset_state()
+            print(f"Calculating {curve.name} failed: {e}")
+        finally:
+            with self.lock:
+                self.running.discard(curve)
+                if curve in self.pending:
+                    self.start(curve)
+
+    def wait(self):
+        # Blocks until all submitted requests are computed and published
+        while True:
+            with self.lock:
+                if not self.running and not self.pending:
+                    return
+            time.sleep(0.001)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def Solve_spec(spec, buffers):
+    # Runs in a worker process: rebuilds the curve from its spec, solves it and writes
+    # the arrays into the shared memory blocks given by buffers (name -> (block, shape))
+    funs.ODECurve.backend = None
+    funs.Curve.result_cache = None
+    curveClass = getattr(funs, spec['className'])
+    # The constructor solves, with the ensemble already set
+    curve = curveClass(name=spec['name'], is_parametric=spec['is_parametric'], inpParams=spec['inpParams'], solver=spec['solver'], ensemble=spec['ensemble'])
+    for name, (block_name, shape) in buffers.items():
+        block = SharedMemory(name=block_name)
+        array = getattr(curve, name)
+        np.ndarray(shape, dtype=float, buffer=block.buf)[:len(array)] = array
+        block.close()
+    return len(curve.y), curve.method
+
+def Warm_up():
+    # Runs in a worker process, which has imported this module (funs, scipy) by then
+    return os.getpid()
+
+class ProcessBackend:
+    # Full ODE solves in worker processes, so they neither hold the GIL of the UI nor share one core;
+    # results come back through shared memory instead of being pickled
+    def __init__(self, max_workers = None, min_size = 20000):
+        # spawn: forking a process running Tk and pygame threads is not safe. Workers import
+        # compute and funs; the entry script (run.py) leaves everything else under its guard
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        self.min_size = min_size  # Npoints*state size; smaller solves are quicker in process than the round trip
+        # Workers start now rather than on the first solve, which would otherwise wait for them
+        for k in range(self.max_workers):
+            self.executor.submit(Warm_up)
+
+    def takes(self, curve):
+        return curve.Npoints*curve.state_size() >= self.min_size
+
+    def solve(self, curve):
+        # Fills t_vec, xyz and y of curve like ODECurve.calculate does, False when the solve stopped early
+        Npoints = curve.Npoints
+        shapes = {'t_vec': (Npoints,), 'xyz': (Npoints, curve.Neqs), 'y': (Npoints, curve.state_size())}
+        blocks = {name: SharedMemory(create=True, size=max(int(np.prod(shape)), 1)*8) for name, shape in shapes.items()}
+        try:
+            buffers = {name: (blocks[name].name, shape) for name, shape in shapes.items()}
+            Nsolved, method = self.executor.submit(Solve_spec, curve.get_spec(), buffers).result()
+            for name, shape in shapes.items():
+                setattr(curve, name, np.array(np.ndarray(shape, dtype=float, buffer=blocks[name].buf)))
+        finally:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+        curve.y = curve.y[:Nsolved]
+        curve.method = method
+        curve.current_index = Npoints - 1
+        curve.revision += 1
+        return Nsolved == Npoints
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+precomputer = Precomputer()
+scheduler   = Scheduler()
@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+import threading
+import argparse
+import numpy as np
+
+from PIL import Image, GifImagePlugin
+
+import headless
+import pygame
+
+import compute
+import catalog
+
+def Animation_frames(renderer, curve, param, values, increment = 0.0, rescale = False, uniform = True):
+    # One rendered surface per value, produced only when the writer asks for it. Like the
+    # animation buttons: t steps extend the trajectory by increment, other parameters are
+    # recomputed, the values ahead being computed meanwhile by the precompute pool
+    lookahead = compute.precomputer.lookahead
+    for index, value in enumerate(values):
+        if increment:
+            curve.set_param(param, value)
+            curve.calculate(increment)
+        else:
+            compute.precomputer.prefetch(curve, param, values[index:index + 1 + lookahead])
+            curve.set_param(param, value)
+            compute.precomputer.wait(curve, param, curve.cache_key())
+            curve.calculate()
+        if rescale:
+            renderer.set_scale(curve, uniform)
+        yield renderer.render()
+
+def Frame_image(surface):
+    return Image.frombytes('RGB', surface.get_size(), pygame.image.tobytes(surface, 'RGB'))
+
+def Write_png(renderer, frames, pattern):
+    # Numbered files, encoded by the writer threads of the renderer
+    count = 0
+    for surface in frames:
+        renderer.save(pattern.format(count))
+        count += 1
+    return count
+
+def Write_gif(frames, path, fps, loop = 0):
+    # Pillow's save_all keeps every frame for the optimizer, so the file is written frame by
+    # frame instead; all frames share the palette taken from the first one
+    count, palette = 0, None
+    with open(path, 'wb') as fp:
+        for surface in frames:
+            image = Frame_image(surface)
+            if palette is None:
+                palette = image.quantize(256, dither=Image.Dither.NONE)
+                header, used_colors = GifImagePlugin.getheader(palette, info={'loop': loop, 'optimize': False})
+                fp.write(b"".join(header))
+            frame = image.quantize(palette=palette, dither=Image.Dither.NONE)
+            fp.write(b"".join(GifImagePlugin.getdata(frame, duration=1000/fps)))
+            count += 1
+        fp.write(b";")
+    return count
+
+def Write_webp(frames, path, fps, loop = 0, quality = 80):
+    # Pillow's WebP encoder takes the whole animation at once (append_images becomes a list),
+    # so unlike GIF and PNG the frames are all held in memory
+    images = [Frame_image(surface) for surface in frames]
+    images[0].save(path, format='WEBP', save_all=True, append_images=images[1:], duration=1000/fps, loop=loop, quality=quality)
+    return len(images)
+
+def Animation_values(param, values):
+    values = list(values)
+    if not values:
+        raise ValueError(f"No values of {param} to animate, nothing exported")
+    return values
+
+def Export_animation(renderer, curve, param, values, path, fps = 10, increment = 0.0, rescale = False, uniform = True):
+    # Renders the parameter animation into a PNG sequence (path with a {} for the frame
+    # number), an animated GIF or WebP, and reports the throughput
+    values = Animation_values(param, values)
+    directory = os.path.dirname(path.format(0))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    frames = Animation_frames(renderer, curve, param, values, increment, rescale, uniform)
+    extension = os.path.splitext(path)[1].lower()
+
+    started = time.time()
+    if   extension == '.gif':
+        count = Write_gif(frames, path, fps)
+    elif extension == '.webp':
+        count = Write_webp(frames, path, fps)
+    elif extension == '.png':
+        count = Write_png(renderer, frames, path if '{' in path else path[:-4] + '_{:05d}.png')
+    else:
+        raise ValueError(f"Unknown export format: {extension}")
+    renderer.close()
+    elapsed = time.time() - started
+    print(f"{count} frames to {path} in {elapsed:.2f} s ({count/max(elapsed, 1e-9):.1f} frames/s)")
+    return count, elapsed
+
+def Detached(curve):
+    # Copy of a shown curve that can be stepped without writing into its arrays or its solver
+    twin = curve.spawn()
+    twin.reset_state()
+    twin.lock = threading.Lock()
+    for name in ('t_vec', 'xyz', 'y'):
+        if hasattr(twin, name):
+            setattr(twin, name, np.array(getattr(twin, name)))
+    return twin
+
+def Export_window(window, curve, param, values, path, fps = 10, increment = 0.0):
+    # The animation as the interactive window shows it, curve being stepped on a detached copy
+    values = Animation_values(param, values)
+    renderer = headless.HeadlessRenderer(window.Xlen, window.Ylen, len(window.Areas), window.antialias)
+    twin = Detached(curve)
+    renderer.copy_view(window, {curve: twin})
+    return Export_animation(renderer, twin, param, values, path, fps, increment)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Export a parameter animation of stored curves as PNG frames, GIF or WebP.")
+    parser.add_argument('--db', default='curves.db')
+    parser.add_argument('--curve', action='append', required=True, metavar='ID[:AREA[:DIAGS]]', help="curve to show, e.g. 5:2:tx,ty")
+    parser.add_argument('--set', action='append', default=[], metavar='ID:PARAM=VALUE', help="parameter value applied before rendering")
+    parser.add_argument('--animate', required=True, metavar='ID:PARAM=START:STOP:COUNT', help="parameter stepped over the frames")
+    parser.add_argument('--increment', type=float, default=0.0, help="t step per frame of ODE curves, extending the trajectory")
+    parser.add_argument('--layout', type=int, help="number of areas (1-4), defaults to the highest area used")
+    parser.add_argument('--size', default='1000x1000', metavar='WxH')
+    parser.add_argument('--fps', type=float, default=10)
+    parser.add_argument('--out', default='animation.gif', help=".gif, .webp or .png (numbered with {} or a suffix)")
+    parser.add_argument('--rescale', action='store_true', help="fit the scale to every frame instead of the first one")
+    parser.add_argument('--antialias', action='store_true')
+    args = parser.parse_args(argv)
+
+    shown = [headless.Parse_curve(text) for text in args.curve]
+    width, height = (int(val) for val in args.size.lower().split('x'))
+    style = args.layout or max(area_id for curve_id, area_id, diags in shown)
+    renderer = headless.HeadlessRenderer(width, height, style, args.antialias)
+
+    records, curves = {}, {}
+    for curve_id, area_id, diags in shown:
+        if curve_id not in curves:
+            records[curve_id], curves[curve_id] = catalog.Load_curve(args.db, curve_id)
+    for curve_id, param, value in (headless.Parse_assignment(text) for text in args.set):
+        curves[curve_id].set_param(param, float(value))
+        curves[curve_id].calculate()
+    for curve_id, area_id, diags in shown:
+        renderer.add_curve(curves[curve_id], area_id, diags, not records[curve_id].scale)
+
+    curve_id, param, value_range = headless.Parse_assignment(args.animate)
+    start, stop, count = value_range.split(':')
+    values = np.linspace(float(start), float(stop), int(count))
+    Export_animation(renderer, curves[curve_id], param, values, args.out, args.fps, args.increment, args.rescale, not records[curve_id].scale)
+    compute.precomputer.shutdown()
+    pygame.quit()
+
+if __name__ == "__main__":
+    sys.exit(main())
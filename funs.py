@@ -1,7 +1,14 @@
 import numpy as np
-import math, re 
+import math, re, copy
+import sys, time, hashlib
+import threading
+import scipy.sparse
 
-from scipy.integrate import solve_ivp, odeint, RK45
+from collections import namedtuple
+
+from scipy.integrate import solve_ivp, odeint, RK23, RK45, DOP853, Radau, BDF, LSODA, OdeSolution
+
+import cache
 
 bColors = {}
 bColors['xy']  = 'orange'
@@ -17,8 +24,45 @@ fn_label['ty'] = "y(t)"
 fn_label['tz'] = "z(t)"
 fn_label['xyz'] = "z(x,y)"
 
+area_colors = {}
+area_colors[1] = (255, 255, 255)
+area_colors[2] = (212, 255, 255)
+area_colors[3] = (255, 232, 255)
+area_colors[4] = (255, 255, 222)
+
+ode_methods = {'RK23': RK23, 'RK45': RK45, 'DOP853': DOP853, 'Radau': Radau, 'BDF': BDF, 'LSODA': LSODA}
+implicit_methods = ['Radau', 'BDF', 'LSODA']  # these make use of ODECurve.jacobian
+
+# What Area draws: rows below up_idx of these arrays are never written again, later results
+# go to new arrays or past up_idx, so a snapshot stays consistent without locking
+Snapshot = namedtuple('Snapshot', ['t_vec', 'xyz', 'members', 'up_idx', 'revision'])
+
+def Grow_rows(array, new_size):
+    # Copy of array with room for new_size rows, the new rows are zero
+    grown = np.zeros((new_size,) + array.shape[1:])
+    grown[:len(array)] = array
+    return grown
+
+source_digests = {}  # module name -> hash of its source file
+
+def Source_digest(curveClass):
+    # Part of the keys of stored results, so that editing the module of a curve class does not
+    # bring back old results. The file is read once per module and session
+    module = curveClass.__module__
+    if module not in source_digests:
+        try:
+            with open(sys.modules[module].__file__, 'rb') as fp:
+                source_digests[module] = hashlib.sha1(fp.read()).hexdigest()
+        except (KeyError, AttributeError, TypeError, OSError):
+            source_digests[module] = module
+    return source_digests[module]
+
 # Base Curve class (shared by all curve types)
 class Curve:
+    result_cache = cache.results  # None turns memoization off
+    result_store = None           # cache.TrajectoryStore keeping slow results across sessions
+    param_map    = {}             # slider parameter name -> attribute, given by each class
+    
     def __init__(self, name = "Curve", color="black", thickness = 1, xyz0=[], is_parametric=0, formula=None, inpParams={}, Neqs = 2, Ndims = 2):
         self.name      = name
         self.color     = color
@@ -39,6 +83,14 @@ class Curve:
         self.Ndims   = Ndims
 
         self.xyz0 = xyz0
+        self.revision = 0  # bumped whenever t_vec/xyz are regenerated, lets views cache derived data
+        
+        # Sweep: {attribute: K values} evaluated together into the (K, Npoints, 2) members fan
+        self.sweep   = None
+        self.members = None
+        
+        self.lock     = threading.Lock()  # serializes publishing, readers use the snapshot
+        self.snapshot = None
         self.erase() 
 
         self.sets = []
@@ -67,8 +119,6 @@ class Curve:
                 self.t_lst   = [self.t0]
             else:
                 self.params[param] = inpParamSet
-                
-        self.param_map = {}
     
     def set_param(self, param, val):
         if param in self.param_map:
@@ -79,6 +129,101 @@ class Curve:
     def set_params(self):
       for param in self.param_map:
         self.set_param(param, float(self.params[param][4]))
+        
+    def get_attrs(self):
+        # Current values of the parameters, t is the variable and not one of them
+        return {attr: getattr(self, attr) for param, attr in self.param_map.items() if param != 't'}
+        
+    def set_sweep(self, values, combine = 'product'):
+        # values maps param_map names to ranges; 'product' takes every combination, 'zip' pairs them up
+        if not values:
+            self.sweep, self.members = None, None
+            return
+        for param in values:
+            if param not in self.param_map or param == 't':
+                raise ValueError(f"Unknown parameter name: {param}")
+        ranges = [np.asarray(vals, dtype=float).ravel() for vals in values.values()]
+        if combine == 'product':
+            ranges = [grid.ravel() for grid in np.meshgrid(*ranges, indexing='ij')]
+        elif combine == 'zip':
+            if len({len(vals) for vals in ranges}) > 1:
+                raise ValueError("Zipped sweep ranges must have the same length")
+        else:
+            raise ValueError(f"Unknown sweep combination: {combine}")
+        self.sweep = {self.param_map[param]: vals for param, vals in zip(values, ranges)}
+
+    def precomputable(self):
+        # Whether calculate() of a spawned copy ends up in the result cache
+        return self.result_cache is not None
+        
+    def spawn(self):
+        # Copy to compute on another thread; calculate() allocates new arrays or only writes
+        # rows past current_index, so readers of this curve are not disturbed
+        return copy.copy(self)
+        
+    def state_fields(self):
+        # Attributes a computation changes, the parameters included
+        return ['t_vec', 'xyz', 'members', 'current_index', 'revision'] + list(self.param_map.values())
+        
+    def make_snapshot(self):
+        return Snapshot(self.t_vec, self.xyz, self.get_members(), self.current_index + 1, self.revision)
+        
+    def get_snapshot(self):
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.revision != self.revision:
+            # Computed in place rather than published (constructors), or a publish is under way
+            with self.lock:
+                snapshot = self.snapshot = self.make_snapshot()
+        return snapshot
+        
+    def publish(self, twin):
+        # Results computed on a spawned copy become this curve's state; the snapshot reference
+        # is swapped first, readers never see the fields half copied
+        with self.lock:
+            self.snapshot = twin.make_snapshot()
+            for name in self.state_fields():
+                if hasattr(twin, name):
+                    setattr(self, name, getattr(twin, name))
+                    
+    def reset_state(self):
+        pass
+        
+    def cache_key(self):
+        return (type(self).__name__, cache.Freeze(self.get_attrs()), self.tmin, self.tmax, self.Npoints, cache.Freeze(self.sweep))
+        
+    def cached_arrays(self):
+        arrays = {'t_vec': self.t_vec, 'xyz': self.xyz}
+        if self.members is not None:
+            arrays['members'] = self.members
+        return arrays
+        
+    def restore_cached(self, key):
+        # A hit replaces the computed arrays by the (read-only) cached ones
+        if self.result_cache is None:
+            return False
+        arrays = self.result_cache.get(key)
+        if arrays is None and self.result_store is not None:
+            arrays = self.result_store.get((key, Source_digest(type(self))))  # memory-mapped
+            if arrays is not None:
+                self.result_cache.put(key, arrays)
+        if arrays is None:
+            return False
+        self.restore_arrays(arrays)
+        self.current_index = len(self.t_vec) - 1
+        self.revision += 1
+        return True
+        
+    def restore_arrays(self, arrays):
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        
+    def store_cached(self, key, seconds = 0.0):
+        # seconds: how long the computation took, only slow ones are written to the result store
+        if self.result_cache is not None:
+            arrays = self.cached_arrays()
+            self.result_cache.put(key, arrays)
+            if self.result_store is not None and seconds >= self.result_store.min_seconds:
+                self.result_store.put((key, Source_digest(type(self))), arrays)
 
     def erase(self):
         self.t_vec = np.zeros(self.Npoints)
@@ -89,6 +234,7 @@ class Curve:
         self.erase()
         self.t_vec = np.linspace(self.tmin, self.tmax, self.Npoints, endpoint=True)  
         self.current_index = len(self.t_vec) - 1
+        self.revision += 1
     
     def after_init(self):
         self.props  = {set:(bColors[set], 2) for set in self.sets}
@@ -96,15 +242,263 @@ class Curve:
         self.set_params()
         self.calculate()
     
+    def get_members(self):
+        # (M, len(t_vec), Neqs) trajectories sharing t_vec, a plain curve is its only member
+        if self.members is not None:
+            return self.members
+        return self.xyz[np.newaxis]
+        
+    def evaluate(self, t, **attrs):
+        # Closed-form curves return (x, y); attrs may be (K, 1) columns broadcasting against t
+        raise NotImplementedError
+    
     #@run_get_min_max_after
     def calculate(self, *args, **kwargs):
-        pass
+        key = self.cache_key()
+        if self.restore_cached(key):
+            return
+        self.init()
+        attrs = self.get_attrs()
+        self.xyz[:,0], self.xyz[:,1] = self.evaluate(self.t_vec, **attrs)
+        if self.sweep is not None:
+            # The whole family in one broadcasted evaluation
+            attrs.update({attr: vals[:, np.newaxis] for attr, vals in self.sweep.items()})
+            K = len(next(iter(self.sweep.values())))
+            self.members = np.empty((K, len(self.t_vec), 2))
+            self.members[:,:,0], self.members[:,:,1] = self.evaluate(self.t_vec, **attrs)
+        self.store_cached(key)
 
 class ODECurve(Curve):
-    def __init__(self, **kwargs):
+    # 'method' is a key of ode_methods or 'auto' (LSODA when the system looks stiff, explicit otherwise)
+    solver_options = {'method': 'RK23', 'rtol': 1e-3, 'atol': 1e-6, 'max_step': np.inf}
+    stiff_threshold = 1000.0  # explicit steps needed for stability over [tmin, tmax] before 'auto' goes implicit
+    
+    dense_output = False  # t slider scrubs an interpolated trajectory instead of appending steps
+    backend      = None   # e.g. compute.ProcessBackend, runs the full solves out of this process
+    jacobian     = None   # analytic d(odesystem)/dz, subclasses define it as a method
+    vectorized   = True   # odesystem takes z of shape (Neqs, k) and returns an array of the same shape
+
+    def __init__(self, solver=None, ensemble=None, **kwargs):
+        self.solver_options = {**type(self).solver_options, **(solver or {})}
+        self.method = None  # resolved solver_options['method'], measured again on every restart
+        
+        # Ensemble mode: (M, Neqs) initial states integrated together as one stacked system,
+        # self.y then holds M*Neqs columns, member after member
+        self.ensemble = None
+        
+        self.solver   = None
+        self.solver_t = None
+        
+        # Dense mode: step boundaries and local interpolants of everything integrated so far
+        self.step_ts      = []
+        self.step_interps = []
+        self.filled_index = -1  # last t grid point evaluated from the interpolants
+        self.dense_key    = None  # cache key of the evaluated grid, it may come from the result cache
         super().__init__(**kwargs)
         self.y  = np.zeros((1, self.Neqs))
         self.y0 = np.zeros(self.Neqs)
+        if ensemble is not None:
+            self.set_ensemble(ensemble)  # before the first calculate of the subclass constructor
+        
+    def set_param(self, param, val):
+        super().set_param(param, val)
+        if param != 't':
+            self.solver = None  # its step size and last derivative belong to the old parameters
+        
+    def set_sweep(self, values, combine = 'product'):
+        # Only closed-form curves are evaluated over parameter ranges; calculate() would ignore the sweep
+        if values:
+            raise ValueError(f"{type(self).__name__} cannot sweep parameters, use set_ensemble for a family of initial states")
+        super().set_sweep(values, combine)
+        
+    def set_ensemble(self, y0s):
+        # None goes back to the single trajectory given by the y0 parameters
+        self.ensemble = None if y0s is None else np.array(y0s, dtype=float).reshape(-1, self.Neqs)
+        self.solver = None
+        
+    def state_size(self):
+        return self.Neqs if self.ensemble is None else self.ensemble.size
+        
+    def get_members(self):
+        if self.ensemble is None:
+            return super().get_members()
+        return self.y.reshape(len(self.y), -1, self.Neqs).swapaxes(0, 1)
+        
+    def ensemble_system(self, t, Z):
+        # All members go through one vectorized odesystem call, Z is (M*Neqs,) or (M*Neqs, k)
+        M = len(self.ensemble)
+        z = Z.reshape(M, self.Neqs, -1).swapaxes(0, 1).reshape(self.Neqs, -1)
+        dz = np.asarray(self.odesystem(t, z))
+        return dz.reshape(self.Neqs, M, -1).swapaxes(0, 1).reshape(Z.shape)
+        
+    def get_system(self):
+        return self.odesystem if self.ensemble is None else self.ensemble_system
+        
+    def precomputable(self):
+        return super().precomputable() and not self.dense_output
+        
+    def spawn(self):
+        # The solver goes along so that t increments continue the trajectory
+        twin = super().spawn()
+        twin.step_ts, twin.step_interps = list(self.step_ts), list(self.step_interps)
+        return twin
+        
+    def state_fields(self):
+        return super().state_fields() + ['y', 'y0', 'method', 'solver', 'solver_t', 'step_ts', 'step_interps', 'filled_index', 'dense_key']
+        
+    def reset_state(self):
+        # After a failed computation the shared solver may be ahead of solver_t
+        self.solver = None
+        self.dense_key = None
+        
+    def get_spec(self):
+        # Everything a worker process needs to rebuild this curve and solve it the same way
+        params = {param: list(vals) for param, vals in self.params.items()}
+        for param, attr in self.param_map.items():
+            if param in params and param != 't':
+                params[param][4] = getattr(self, attr)
+        if 't' in params:
+            params['t'][2:7] = [self.tmin, self.tmax, self.t0, self.tincr, self.Npoints]
+        return {'className': type(self).__name__, 'name': self.name, 'is_parametric': self.is_parametric,
+                'inpParams': params, 'solver': dict(self.solver_options), 'ensemble': self.ensemble}
+        
+    def cache_key(self):
+        # Only full solves are memoized; single y0 values are among the attrs already
+        return super().cache_key() + (cache.Freeze(self.ensemble), cache.Freeze(self.solver_options))
+        
+    def cached_arrays(self):
+        # xyz is the first Ndims columns of y, rebuilt on restore rather than cached twice
+        arrays = {'t_vec': self.t_vec, 'y': self.y}
+        if self.members is not None:
+            arrays['members'] = self.members
+        return arrays
+        
+    def restore_arrays(self, arrays):
+        super().restore_arrays(arrays)
+        xyz = np.zeros((len(self.y), self.Neqs))
+        xyz[:, :self.Ndims] = self.y[:, :self.Ndims]
+        self.xyz = xyz
+        
+    def estimate_stiffness(self, t, z):
+        # Number of steps an explicit method would need for stability over the whole t range
+        if self.jacobian is None:
+            return np.inf
+        decay = 0.0
+        for member_z in np.reshape(z, (-1, self.Neqs)):
+            eigvals = np.linalg.eigvals(np.asarray(self.jacobian(t, member_z), dtype=float))
+            decay = max(decay, np.max(-eigvals.real, initial=0.0))
+        return decay * abs(self.tmax - self.tmin)
+        
+    def resolve_method(self, t, z):
+        method = self.solver_options['method']
+        if method == 'auto':
+            if self.estimate_stiffness(t, z) > self.stiff_threshold:
+                method = 'LSODA'
+            else:
+                method = 'DOP853' if self.solver_options['rtol'] < 1e-6 else 'RK45'
+        self.method = method
+        return method
+        
+    def solver_kwargs(self, method):
+        kwargs = {key: val for key, val in self.solver_options.items() if key != 'method'}
+        kwargs['vectorized'] = self.vectorized
+        if method not in implicit_methods:
+            return kwargs
+        if self.ensemble is not None:
+            # Members do not interact: the Jacobian is block diagonal, which keeps finite differences cheap
+            if method == 'LSODA':
+                kwargs['lband'] = kwargs['uband'] = self.Neqs - 1
+            else:
+                block = np.ones((self.Neqs, self.Neqs))
+                kwargs['jac_sparsity'] = scipy.sparse.block_diag([block]*len(self.ensemble), format='csc')
+        elif self.jacobian is not None:
+            kwargs['jac'] = self.jacobian
+        return kwargs
+        
+    def new_solver(self, t_start, y_start):
+        method = self.resolve_method(t_start, y_start)
+        return ode_methods[method](self.get_system(), t_start, y_start, t_bound=np.inf, **self.solver_kwargs(method))
+        
+    def advance_solver(self, t_start, y_start, new_t):
+        # Keep one solver running across increments instead of a new solve_ivp per step
+        if self.solver is None or self.solver_t != t_start:
+            self.solver = self.new_solver(t_start, y_start)
+        while self.solver.t < new_t:
+            self.solver.step()
+            if self.solver.status == 'failed':
+                self.solver = None
+                raise RuntimeError(f"{self.name}: integration failed at t={t_start}")
+        self.solver_t = new_t
+        # new_t lies within the last step, so its local interpolant is enough
+        return self.solver.dense_output()(new_t)
+        
+    def extend_trajectory(self, t_end):
+        # Integrate lazily: only the part beyond the current frontier is solved
+        if self.solver is None:
+            self.set_y0()
+            self.solver = self.new_solver(self.tmin, self.y0)
+            self.step_ts      = [self.tmin]
+            self.step_interps = []
+        while self.solver.t < t_end:
+            self.solver.step()
+            if self.solver.status == 'failed':
+                self.solver = None
+                raise RuntimeError(f"{self.name}: integration failed at t={self.step_ts[-1]}")
+            self.step_ts.append(self.solver.t)
+            self.step_interps.append(self.solver.dense_output())
+            
+    def calculate_dense(self):
+        # Points on a fixed t grid up to the slider value; ones already evaluated are reused,
+        # so scrubbing within the integrated range costs nothing but an index change
+        key = self.cache_key()
+        restart = self.solver is None and self.dense_key != key
+        if restart:
+            started = time.perf_counter()
+            self.dense_key = key
+            if self.restore_cached(key):
+                # A whole grid, without the solver: going past tmax integrates again from tmin
+                self.filled_index = len(self.t_vec) - 1
+            else:
+                self.erase()
+                self.y = np.zeros((self.Npoints, self.state_size()))
+                self.filled_index = -1
+            
+        if self.Npoints > 1 and self.tmax > self.tmin:
+            dt    = (self.tmax - self.tmin)/(self.Npoints - 1)
+            t_end = max(self.t, self.tmin)
+            last  = int(np.floor((t_end - self.tmin)/dt + 1e-9))
+        else:
+            dt, last = 0.0, 0  # the one point at tmin, as np.linspace gives in init()
+        if last > self.filled_index:
+            while last >= len(self.t_vec) or not self.y.flags.writeable:
+                self.grow_buffers()  # also copies read-only arrays restored from the result cache
+            new_i = np.arange(self.filled_index + 1, last + 1)
+            new_t = self.tmin + dt*new_i
+            self.extend_trajectory(new_t[-1])
+            
+            if not self.step_interps:
+                new_y = np.tile(self.y0, (len(new_t), 1))  # nothing integrated yet, all the points are at tmin
+            else:
+                # Only the steps covering the new points are needed for the interpolation
+                first_step = max(np.searchsorted(self.step_ts, new_t[0], side='right') - 1, 0)
+                segment = OdeSolution(self.step_ts[first_step:], self.step_interps[first_step:])
+                new_y = segment(new_t).T
+            self.t_vec[new_i] = new_t
+            self.y[new_i]     = new_y
+            self.xyz[new_i, :self.Ndims] = new_y[:, :self.Ndims]
+            self.filled_index = last
+            if restart and last == len(self.t_vec) - 1:
+                self.store_cached(key, time.perf_counter() - started)  # the grid covers the whole t range
+            
+        self.current_index = last
+        self.revision += 1
+        
+    def grow_buffers(self):
+        # Geometric growth keeps appending steps amortized O(1)
+        new_size = max(2*len(self.t_vec), self.Npoints)
+        self.t_vec = Grow_rows(self.t_vec, new_size)
+        self.y     = Grow_rows(self.y, new_size)
+        self.xyz   = Grow_rows(self.xyz, new_size)
         
     def odesystem(self, t, z):
         pass
@@ -116,6 +510,9 @@ class ODECurve(Curve):
         return {int(pattern.match(k).group(1))-1: v for k, v in vars(self).items() if pattern.match(k)}
             
     def set_y0(self):        
+        if self.ensemble is not None:
+            self.y0 = self.ensemble.ravel()
+            return
         y0_parameters = self.get_y0_parameters()
         if set(list(range(self.Neqs))) != set(list(y0_parameters.keys())):
             print("!"*39)
@@ -129,64 +526,66 @@ class ODECurve(Curve):
         self.labels = {set:fn_label[set] for set in self.sets}
         self.set_params()  
         self.set_y0()      
+        if self.dense_output:
+            self.t = self.tmax  # the t slider starts at tmax
         self.calculate()   
             
     def calculate(self, tIncrement = 0.0):
-        if tIncrement:
+        if self.dense_output:
+          self.calculate_dense()
+        elif tIncrement:
           if  len(self.t_vec) == 0:
             self.init()
-            self.y  = np.zeros((self.Npoints, self.Neqs))
+            self.y  = np.zeros((self.Npoints, self.state_size()))
             self.set_y0()
             self.y[0]   = self.y0
-            self.xyz[0] = self.y0
+            self.xyz[0, :self.Ndims] = self.y0[:self.Ndims]
             
             self.current_index = 0
           else:
-            if self.current_index+1 >= len(self.t_vec):
-                self.t_vec = np.concatenate((self.t_vec, np.zeros(self.Npoints)))
-                self.y     = np.vstack(( self.y , np.zeros((self.Npoints, self.Neqs))))
-                self.xyz   = np.vstack((self.xyz, np.zeros((self.Npoints, self.Neqs))))
+            if self.current_index+1 >= min(len(self.t_vec), len(self.y)) or not self.y.flags.writeable:
+                self.grow_buffers()  # also copies read-only arrays restored from the result cache
  
           current_i = self.current_index
           new_t = self.t_vec[current_i] + tIncrement
-          t_span = (self.t_vec[current_i], new_t)
-          
-          solution = solve_ivp(
-            self.odesystem,
-            t_span,
-            self.y[current_i],  
-            t_eval=[new_t]  
-          )
+          new_y = self.advance_solver(self.t_vec[current_i], self.y[current_i], new_t)
           
           # Update all variables
           next_i = current_i + 1
           self.t_vec[next_i] = new_t
-          self.y[next_i] = solution.y[:, -1]  
-          for ei in range(self.Ndims):
-            self.xyz[next_i, ei] = solution.y[ei]
+          self.y[next_i] = new_y
+          self.xyz[next_i, :self.Ndims] = new_y[:self.Ndims]
           self.current_index = next_i
+          self.revision += 1
           
         else:
-          #meth = "RK45"
-          meth = "RK23"
-          #meth = "Radau"
-          #meth = "BDF"
-          #meth = "LSODA"
-          #meth = "DOP853"
+          key = self.cache_key()
+          if self.restore_cached(key):
+            return
+          started = time.perf_counter()
+          if self.backend is not None and self.backend.takes(self):
+            self.set_y0()
+            if self.backend.solve(self):
+              self.store_cached(key, time.perf_counter() - started)
+            return
           self.init()
           self.set_y0()
           t_span = (self.t_vec[0], self.t_vec[-1])
+          meth = self.resolve_method(t_span[0], self.y0)
           
           solution = solve_ivp(
-            self.odesystem,
+            self.get_system(),
             t_span,
             self.y0,  
             method=meth,
-            t_eval=self.t_vec  
+            t_eval=self.t_vec,
+            **self.solver_kwargs(meth)
           )
           self.y = solution.y.T
           for ei in range(self.Ndims):
             self.xyz[:,ei] = solution.y[ei]
+          if solution.success:
+            self.store_cached(key, time.perf_counter() - started)
             
 class Line(Curve):
     def __init__(self, x1=0.0, y1=0.0, x2=0.0, y2=0.0, **kwargs):
@@ -195,6 +594,9 @@ class Line(Curve):
         self.xyz[1] = [x2, y2]
         self.current_index = 1
         self.props['xy'] = 'black', 2
+
+    def calculate(self,  *args, **kwargs):
+        pass
         
 class Line3d(Curve):
     def __init__(self, x1=0.0, y1=0.0, z1=0.0, x2=0.0, y2=0.0, z2=0.0, color='black'):
@@ -208,140 +610,141 @@ class Line3d(Curve):
         pass
         
 class Ellipse(Curve):
+    param_map = {
+        'a': 'a',
+        'b': 'b'
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.param_map = {
-            'a': 'a',
-            'b': 'b'
-        }
         self.after_init()
 
-    def calculate(self, *args, **kwargs):
-        self.init()
-        self.xyz[:,0] = self.a * np.cos(self.t_vec)
-        self.xyz[:,1] = self.b * np.sin(self.t_vec)
+    def evaluate(self, t, a, b):
+        return a * np.cos(t), b * np.sin(t)
         
 class Linear(Curve):
+    param_map = {
+        't': 't',
+        'y0': 'y0',
+        'k': 'k',
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.param_map = {
-            't': 't',
-            'y0': 'y0',
-            'k': 'k',
-        }
         self.after_init()
 
-    def calculate(self, *args, **kwargs):
-        self.init()
-        self.xyz[:,0] = self.t_vec
-        self.xyz[:,1] = self.y0 + self.k * (self.t_vec)
+    def evaluate(self, t, y0, k):
+        return t, y0 + k * t
 
 class Parabola(Curve):
+    param_map = {
+        't': 't',
+        'y0': 'y0',
+        'a': 'a',
+        'x0': 'x0',
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.param_map = {
-            't': 't',
-            'y0': 'y0',
-            'a': 'a',
-            'x0': 'x0',
-        }
         self.after_init()
 
-    def calculate(self, *args, **kwargs):
-        self.init()
-        self.xyz[:,0] = self.t_vec
-        self.xyz[:,1] = self.y0 + self.a * (self.t_vec - self.x0)**2
+    def evaluate(self, t, y0, a, x0):
+        return t, y0 + a * (t - x0)**2
 
 class Sinus(Curve):
+    param_map = {
+        'A': 'A',
+        'ω': 'omega',
+        'α': 'alpha',
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.param_map = {
-            'A': 'A',
-            'ω': 'omega',
-            'α': 'alpha',
-        }
         self.after_init()
 
-    def calculate(self, *args, **kwargs):
-        self.init()
-        self.xyz[:,0] = self.t_vec
-        self.xyz[:,1] = self.A * np.sin(self.omega*self.t_vec + self.alpha)
+    def evaluate(self, t, A, omega, alpha):
+        return t, A * np.sin(omega*t + alpha)
 
 class Exponential(Curve):
+    param_map = {
+        't': 't',
+        'A': 'A', 
+        'k': 'k',
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.param_map = {
-            't': 't',
-            'A': 'A', 
-            'k': 'k',
-        }
         self.after_init()
 
-    def calculate(self, *args, **kwargs):
-        self.init()
-        self.xyz[:,0] = self.t_vec
-        self.xyz[:,1] = self.A * np.exp(self.k*self.t_vec)
+    def evaluate(self, t, A, k):
+        return t, A * np.exp(k*t)
 
 class Gaussian(Curve):
+    param_map = {
+        't': 't',
+        'σ': 'sigma',
+        'µ': 'x0',
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.param_map = {
-            't': 't',
-            'σ': 'sigma',
-            'µ': 'x0',
-        }
         self.after_init()
 
-    def calculate(self, *args, **kwargs):
-        self.init()
-        self.xyz[:,0] = self.t_vec
-        self.xyz[:,1] = np.exp((-(self.t_vec - self.x0)**2)/(2*self.sigma*self.sigma))/(self.sigma*np.sqrt(2.0*np.pi))
+    def evaluate(self, t, sigma, x0):
+        return t, np.exp((-(t - x0)**2)/(2*sigma*sigma))/(sigma*np.sqrt(2.0*np.pi))
 
 class RoseSin(Curve):
+    param_map = {
+        't': 't',
+        'A': 'A',
+        'n': 'n',
+    }
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.param_map = {
-            't': 't',
-            'A': 'A',
-            'n': 'n',
-        }
         self.after_init()
 
-    def calculate(self, *args, **kwargs):
-        self.init()
-        t_fi = self.t_vec
-        t_r  = self.A*np.sin(self.n*t_fi)
-        self.xyz[:,0] = t_r*np.cos(t_fi)
-        self.xyz[:,1] = t_r*np.sin(t_fi)
+    def evaluate(self, t, A, n):
+        t_fi = t
+        t_r  = A*np.sin(n*t_fi)
+        return t_r*np.cos(t_fi), t_r*np.sin(t_fi)
 
 class Oscillator(ODECurve):
+    param_map = {
+        't': 't',
+        'k' : 'k', 
+        'x0': 'y0_1',
+        'y0': 'y0_2'
+    }
+
     def __init__(self, is_parametric=1, **kwargs):
         super().__init__(is_parametric=is_parametric, **kwargs)
-        self.param_map = {
-            't': 't',
-            'k' : 'k', 
-            'x0': 'y0_1',
-            'y0': 'y0_2'
-        }
         self.after_init()
 
     def odesystem(self, t, z):
         x, y = z
-        dxdt = y
-        dydt = -self.k * self.k * x
-        return [dxdt, dydt]
+        dz = np.empty(np.shape(z))
+        dz[0] = y
+        dz[1] = -self.k * self.k * x
+        return dz
+
+    def jacobian(self, t, z):
+        return [[0.0, 1.0],
+                [-self.k * self.k, 0.0]]
 
 class SIR(ODECurve):
+    solver_options = {'method': 'auto', 'rtol': 1e-6, 'atol': 1e-9, 'max_step': np.inf}
+    param_map = {
+        't': 't',
+        'β' : 'β', 
+        'γ': 'γ',
+        'S0': 'y0_1',
+        'I0': 'y0_2',
+        'R0': 'y0_3',
+    }
+    
     def __init__(self, is_parametric=1, Neqs=3, **kwargs):
         super().__init__(is_parametric=is_parametric,  Neqs=Neqs, Ndims=3, **kwargs)
-        self.param_map = {
-            't': 't',
-            'β' : 'β', 
-            'γ': 'γ',
-            'S0': 'y0_1',
-            'I0': 'y0_2',
-            'R0': 'y0_3',
-        }
         self.sets = ['tx', 'ty', 'tz']
         self.after_init()
         self.labels['tx'] = "S(t)"
@@ -350,66 +753,91 @@ class SIR(ODECurve):
         
     def odesystem(self, t, z):
         S, I, R = z
-        dSdt = -self.β * I * S
-        dIdt = self.β * I * S - self.γ * I
-        dRdt = self.γ * I
-        return [dSdt, dIdt, dRdt]
+        dz = np.empty(np.shape(z))
+        dz[0] = -self.β * I * S
+        dz[1] = self.β * I * S - self.γ * I
+        dz[2] = self.γ * I
+        return dz
+
+    def jacobian(self, t, z):
+        S, I, R = z
+        return [[-self.β * I, -self.β * S, 0.0],
+                [ self.β * I,  self.β * S - self.γ, 0.0],
+                [ 0.0, self.γ, 0.0]]
         
 class LotkaVolterra(ODECurve):
+    param_map = {
+        't': 't',
+        'α' : 'α', 
+        'β' : 'β', 
+        'γ' : 'γ', 
+        'δ' : 'δ', 
+        'x0': 'y0_1',
+        'y0': 'y0_2'
+    }
+
     def __init__(self, is_parametric=1, **kwargs):
         super().__init__(is_parametric=is_parametric, **kwargs)
-        self.param_map = {
-            't': 't',
-            'α' : 'α', 
-            'β' : 'β', 
-            'γ' : 'γ', 
-            'δ' : 'δ', 
-            'x0': 'y0_1',
-            'y0': 'y0_2'
-        }
         self.after_init()
         
     def odesystem(self, t, z):
         x, y = z
-        dxdt = y
-        dxdt =  self.α * x - self.β * x * y
-        dydt = -self.γ * y + self.δ * x * y
-        return [dxdt, dydt]
+        dz = np.empty(np.shape(z))
+        dz[0] =  self.α * x - self.β * x * y
+        dz[1] = -self.γ * y + self.δ * x * y
+        return dz
+
+    def jacobian(self, t, z):
+        x, y = z
+        return [[self.α - self.β * y, -self.β * x],
+                [self.δ * y, -self.γ + self.δ * x]]
         
 class LorenzSys(ODECurve):
+    solver_options = {'method': 'RK45', 'rtol': 1e-3, 'atol': 1e-6, 'max_step': np.inf}
+    dense_output = True
+    param_map = {
+        't': 't',
+        'σ': 'σ', 
+        'ρ': 'ρ', 
+        'β': 'β',
+        'x0': 'y0_1',
+        'y0': 'y0_2',
+        'z0': 'y0_3',
+    }
+    
     def __init__(self, is_parametric=1, Neqs=3, **kwargs):
         super().__init__(is_parametric=is_parametric, Neqs=Neqs, **kwargs)
-        self.param_map = {
-            't': 't',
-            'σ': 'σ', 
-            'ρ': 'ρ', 
-            'β': 'β',
-            'x0': 'y0_1',
-            'y0': 'y0_2',
-            'z0': 'y0_3',
-        }
         self.after_init()
    
     def odesystem(self, t, inpY):
         x, y, z = inpY
 
-        dxdt  = self.σ*(y-x)
-        dydt  = x*(self.ρ-z) - y
-        dzdt  = x*y - self.β*z
-        return [dxdt, dydt, dzdt]
+        dz = np.empty(np.shape(inpY))
+        dz[0] = self.σ*(y-x)
+        dz[1] = x*(self.ρ-z) - y
+        dz[2] = x*y - self.β*z
+        return dz
+
+    def jacobian(self, t, inpY):
+        x, y, z = inpY
+        return [[-self.σ, self.σ, 0.0],
+                [self.ρ - z, -1.0, -x],
+                [y, x, -self.β]]
                   
 class Newton2D(ODECurve):
+    solver_options = {'method': 'auto', 'rtol': 1e-8, 'atol': 1e-8, 'max_step': np.inf}
+    param_map = {
+        't':   't',
+        'm1':  'm1', 
+        'm2':  'm2', 
+        'x0':  'y0_1',
+        'y0':  'y0_2',
+        'vx0': 'y0_3',
+        'vy0': 'y0_4'
+    }
+    
     def __init__(self, is_parametric=1, Neqs=4, **kwargs):
         super().__init__(is_parametric=is_parametric, Neqs=Neqs, **kwargs)
-        self.param_map = {
-            't':   't',
-            'm1':  'm1', 
-            'm2':  'm2', 
-            'x0':  'y0_1',
-            'y0':  'y0_2',
-            'vx0': 'y0_3',
-            'vy0': 'y0_4'
-        }
         self.after_init()
    
     def odesystem(self, t, z):
@@ -420,38 +848,49 @@ class Newton2D(ODECurve):
         #Fg = 6.67e-5*(self.m1 + self.m2)/(r**3)
         Fg = 6.67*7.465*10*(self.m1 + self.m2)/(r**3)
 
-        dxdt  = vx
-        dydt  = vy
-        dvxdt = -Fg*x
-        dvydt = -Fg*y
-        return [dxdt, dydt, dvxdt, dvydt]
+        dz = np.empty(np.shape(z))
+        dz[0] = vx
+        dz[1] = vy
+        dz[2] = -Fg*x
+        dz[3] = -Fg*y
+        return dz
+
+    def jacobian(self, t, z):
+        x, y, vx, vy = z
+        r2 = x*x + y*y
+        K  = 6.67*7.465*10*(self.m1 + self.m2)/(r2**2.5)
+        axx = -K*(r2 - 3*x*x)
+        ayy = -K*(r2 - 3*y*y)
+        axy = 3*K*x*y
+        return [[0.0, 0.0, 1.0, 0.0],
+                [0.0, 0.0, 0.0, 1.0],
+                [axx, axy, 0.0, 0.0],
+                [axy, ayy, 0.0, 0.0]]
         
 class Hyperbola(Curve):
-    def __init__(self, a, ni, color="cyan"):
-        super().__init__(color)
-        self.a = a  # Hyperbola scaling parameter
-        self.ni = ni  # Angle parameter
-        self.calculate()
-
-    def calculate(self):
-        self.erase()
-        i_vals = np.arange(-self.Npoints, self.Npoints)
-        i_vals = i_vals[i_vals != 0]  # Exclude zero to avoid division by zero
-        i_scaled = i_vals / 100
+    param_map = {
+        't': 't',
+        'a': 'a',    # Hyperbola scaling parameter
+        'ν': 'ni',   # Angle parameter
+    }
+
+    def __init__(self, color="cyan", **kwargs):
+        super().__init__(color=color, **kwargs)
+        self.after_init()
 
-        # Generate x and y points for the hyperbola
-        self.x_vec = self.a * np.cosh(i_scaled) * np.cos(self.ni)
-        self.y_vec = self.a * np.sinh(i_scaled) * np.sin(self.ni)
+    def evaluate(self, t, a, ni):
+        return a * np.cosh(t) * np.cos(ni), a * np.sinh(t) * np.sin(ni)
 
 class test3d(Curve):
+    param_map = {
+        't': 't',
+        'a': 'a',
+        'b': 'b'
+    }
+
     def __init__(self, color="green", thickness=1, x0=0.0, y0=0.0, is_parametric=0, formula=None, inpParams={}):
         super().__init__(color, thickness, x0, y0, is_parametric, formula, inpParams)
         self.name = "TESTING"
-        self.param_map = {
-            't': 't',
-            'a': 'a',
-            'b': 'b'
-        }
         self.set_params()
         self.calculate()
 
@@ -517,33 +956,38 @@ class LineBunch3d(Bunch):
         pass
 
 class EllipseBunch(Bunch):
-    def __init__(self):
+    # Confocal ellipses, all members come from one swept Ellipse
+    def __init__(self, Npoints=200):
         super().__init__()
+        self.ellipse = Ellipse(inpParams={'t': [0.0, 2*np.pi, 0.0, 2*np.pi, 0.0, 0.1, Npoints],
+                                          'a': [0.0, 200.0, 0.0, 200.0, 85.0, 1.0, 10],
+                                          'b': [0.0, 200.0, 0.0, 200.0, 30.0, 1.0, 10]})
+        self.add_curve(self.ellipse)
         self.calculate()
 
     def calculate(self, ae=80):
-        self.erase()
         e = ae
         incr = 5.0
-        for i in range(1, 10):
-            a = 80 + i * incr
-            b = math.sqrt(a * a - e * e)
-            ellipse = Ellipse(a, b)
-            self.add_curve(ellipse)
+        a = 80 + np.arange(1, 10) * incr
+        b = np.sqrt(a * a - e * e)
+        self.ellipse.set_sweep({'a': a, 'b': b}, combine='zip')
+        self.ellipse.calculate()
 
 class HyperbolaBunch(Bunch):
-    def __init__(self):
+    # Confocal hyperbolas, all members come from one swept Hyperbola
+    def __init__(self, Npoints=400):
         super().__init__()
+        self.hyperbola = Hyperbola(inpParams={'t': [-2.0, 2.0, -2.0, 2.0, 0.0, 0.1, Npoints],
+                                              'a': [0.0, 200.0, 0.0, 200.0, 80.0, 1.0, 10],
+                                              'ν': [0.0, np.pi, 0.0, np.pi, np.pi/10, 0.1, 10]})
+        self.add_curve(self.hyperbola)
         self.calculate()
 
     def calculate(self, ae=80):
-        self.erase()
         e = ae
         incr = math.pi / 10
-        for i in range(1, 10):
-            ani = i * incr
-            hyperbola = Hyperbola(e, ani)
-            self.add_curve(hyperbola)
+        self.hyperbola.set_sweep({'a': [e], 'ν': np.arange(1, 10) * incr})
+        self.hyperbola.calculate()
 
 class MixedBunch(Bunch):
     def __init__(self):
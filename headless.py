@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+
+import view
+import catalog
+
+class HeadlessRenderer:
+    # The Area layouts of PygameWindow rendered into an offscreen surface
+    def __init__(self, width=1000, height=1000, style=1, antialias=False):
+        if not pygame.display.get_init():
+            # No window and no Tk: pygame renders into an offscreen surface. Inside the
+            # interactive program the display is already up and is left alone
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        pygame.init()
+        self.window = view.PygameWindow(None, view.denominators, [view.axis], width, height, axis3dLines = [view.axis3d])
+        self.window.screen    = pygame.Surface((width, height))
+        self.window.a_font    = pygame.font.Font(None, 14)
+        self.window.antialias = antialias
+        self.window.arrange_areas(style)
+        self.screen = self.window.screen
+        # Encoding a PNG takes longer than drawing the frame, so files are written on other cores
+        self.writers = os.cpu_count() or 1
+        self.writer  = ThreadPoolExecutor(max_workers=self.writers, thread_name_prefix='png')
+        self.writing = []
+
+    def add_curve(self, curve, area_id = 1, diags = None, uniform = True):
+        area = self.window.Areas[area_id]
+        area.add_curve(curve, diags or curve.sets)
+        area.set_scale(uniform)
+
+    def copy_view(self, window, twins = {}):
+        # Curves, zoom and pan of the areas of an interactive window; curves found in twins are
+        # shown through their twin, so that they can be stepped without touching the window
+        for area_id, shown in window.Areas.items():
+            area = self.window.Areas[area_id]
+            for curve, diags in shown.get_shown():
+                area.add_curve(twins.get(curve, curve), diags)
+            area.scale, area.scaleX, area.scaleY = shown.scale, shown.scaleX, shown.scaleY
+            area.R0 = shown.R0.copy()
+            area.recalculate_grids()
+            area.invalidate()
+
+    def set_scale(self, curve, uniform = True):
+        # Fit the areas showing curve to its current data
+        for area in self.window.Areas.values():
+            if curve in area.curves:
+                area.set_scale(uniform)
+
+    def render(self, path = None):
+        # Areas whose curves did not change keep their pixels; PNG when a path is given
+        for area in self.window.Areas.values():
+            if area.needs_redraw():
+                area.draw()
+        if path:
+            self.save(path)
+        return self.screen
+
+    def save(self, path):
+        # The copy keeps the written frame while the next one is drawn
+        if len(self.writing) >= 2*self.writers:
+            self.writing.pop(0).result()
+        self.writing.append(self.writer.submit(pygame.image.save, self.screen.copy(), path))
+
+    def close(self):
+        # Waits for the frames still being written
+        for future in self.writing:
+            future.result()
+        self.writing = []
+        self.writer.shutdown()
+
+def Parse_curve(text):
+    # ID[:AREA[:DIAG,DIAG...]]
+    parts = text.split(':')
+    curve_id = int(parts[0])
+    area_id  = int(parts[1]) if len(parts) > 1 and parts[1] else 1
+    diags    = parts[2].split(',') if len(parts) > 2 and parts[2] else None
+    return curve_id, area_id, diags
+
+def Parse_assignment(text):
+    # ID:param=value, the value part is returned as text
+    target, value = text.split('=', 1)
+    curve_id, param = target.split(':', 1)
+    return int(curve_id), param, value
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Render curves from the database to PNG files without a display.")
+    parser.add_argument('--db', default='curves.db')
+    parser.add_argument('--curve', action='append', required=True, metavar='ID[:AREA[:DIAGS]]', help="curve to show, e.g. 5:2:tx,ty")
+    parser.add_argument('--set', action='append', default=[], metavar='ID:PARAM=VALUE', help="parameter value applied before rendering")
+    parser.add_argument('--sweep', metavar='ID:PARAM=START:STOP:COUNT', help="one frame per value of a parameter")
+    parser.add_argument('--layout', type=int, help="number of areas (1-4), defaults to the highest area used")
+    parser.add_argument('--size', default='1000x1000', metavar='WxH')
+    parser.add_argument('--out', default='frame_{:05d}.png', help="output file name, formatted with the frame number")
+    parser.add_argument('--rescale', action='store_true', help="fit the scale to every frame instead of the first one")
+    parser.add_argument('--antialias', action='store_true')
+    args = parser.parse_args(argv)
+
+    shown = [Parse_curve(text) for text in args.curve]
+    width, height = (int(val) for val in args.size.lower().split('x'))
+    style = args.layout or max(area_id for curve_id, area_id, diags in shown)
+    renderer = HeadlessRenderer(width, height, style, args.antialias)
+
+    records, curves = {}, {}
+    for curve_id, area_id, diags in shown:
+        if curve_id not in curves:
+            records[curve_id], curves[curve_id] = catalog.Load_curve(args.db, curve_id)
+    for curve_id, param, value in (Parse_assignment(text) for text in args.set):
+        curves[curve_id].set_param(param, float(value))
+        curves[curve_id].calculate()
+    for curve_id, area_id, diags in shown:
+        renderer.add_curve(curves[curve_id], area_id, diags, not records[curve_id].scale)
+
+    if args.sweep:
+        curve_id, param, value_range = Parse_assignment(args.sweep)
+        start, stop, count = value_range.split(':')
+        values = np.linspace(float(start), float(stop), int(count))
+    else:
+        curve_id, param, values = None, None, [None]
+
+    started = time.time()
+    for frame, value in enumerate(values):
+        if value is not None:
+            curves[curve_id].set_param(param, value)
+            curves[curve_id].calculate()
+            if args.rescale:
+                renderer.set_scale(curves[curve_id], not records[curve_id].scale)
+        path = args.out.format(frame)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        renderer.render(path)
+    renderer.close()
+    elapsed = time.time() - started
+    print(f"{len(values)} frames in {elapsed:.2f} s ({60*len(values)/max(elapsed, 1e-9):.0f} frames/min)")
+    pygame.quit()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,22 @@
-import sqlite3
 import io
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import tkinter as tk
 from tkinter import ttk
 
-from tkinter import colorchooser, simpledialog, messagebox
+from tkinter import colorchooser, simpledialog, messagebox, filedialog
 from PIL import Image, ImageTk
 
 import funs
+import compute
+import catalog
+import export
 
-area_colors = {}
-area_colors[1] = (255, 255, 255)
-area_colors[2] = (212, 255, 255)
-area_colors[3] = (255, 232, 255)
-area_colors[4] = (255, 255, 222)
+area_colors = funs.area_colors
 
 def get_color_for_area(areaID):
     if areaID in area_colors:
@@ -22,24 +25,73 @@ def get_color_for_area(areaID):
     else:
         return "lightblue"
 
-def Resize_formula_image(image):
+def Resize_formula_image(image, max_width = 2800, max_height = 500):
+    # Shrunk to fit max_width x max_height, never enlarged
     image_width, image_height = image.size
-    max_width = 2800
-    max_height = 500
-    
-    if image_width > image_height:
-      if image_width > max_width:
-        new_width = max_width
-        new_height = int(new_width * image_height / image_width)
-        #image = image.resize((new_width, new_height), Image.LANCZOS)
-        image = image.resize((new_width, new_height))
-    else:
-      if image_height > max_height:
-        new_height = max_height
-        new_width = int(new_height * image_width / image_height)
-        image = image.resize((new_width, new_height), Image.LANCZOS)
-    
-    return ImageTk.PhotoImage(image)
+    factor = min(1.0, max_width/image_width, max_height/image_height)
+    if factor < 1.0:
+        new_size = (max(1, int(image_width*factor)), max(1, int(image_height*factor)))
+        image = image.convert('RGBA').resize(new_size, Image.LANCZOS)
+    return image
+
+class FormulaImages:
+    """Formula images by curve ID, fetched and decoded off the Tk thread, least recently used dropped first"""
+    def __init__(self, catalog, max_width, max_height, max_bytes = 16*1024*1024):
+        self.catalog    = catalog
+        self.max_width  = max_width
+        self.max_height = max_height
+        self.max_bytes  = max_bytes
+        self.entries    = OrderedDict()  # curve ID -> (nbytes, PIL image, PhotoImage), (0, None, None) without a formula
+        self.nbytes     = 0
+        self.pending    = {}             # curve ID -> future of the decoding
+        self.executor   = ThreadPoolExecutor(max_workers=1, thread_name_prefix='formula')
+
+    def decode(self, curve_id):
+        """Runs on the worker: BLOB to a PIL image of the display size, None without a formula"""
+        png = self.catalog.formula(curve_id)
+        if not png:
+            return None
+        image = Image.open(io.BytesIO(png))
+        image.load()
+        return Resize_formula_image(image, self.max_width, self.max_height)
+
+    def show(self, label, curve_id):
+        """Put the formula image on label as soon as it is decoded"""
+        if not label.winfo_exists():
+            return  # the panel was deleted meanwhile
+        if curve_id in self.entries:
+            self.entries.move_to_end(curve_id)
+            photo = self.entries[curve_id][2]
+        else:
+            if curve_id not in self.pending:
+                self.pending[curve_id] = self.executor.submit(self.decode, curve_id)
+            future = self.pending[curve_id]
+            if not future.done():
+                label.after(20, lambda: self.show(label, curve_id))
+                return
+            del self.pending[curve_id]
+            try:
+                image = future.result()
+            except Exception as e:
+                print(f"Formula image of curve {curve_id} failed: {e}")
+                image = None
+            photo = self.store(curve_id, image)
+        if photo is not None:
+            label.config(image=photo)
+            label.image = photo  # evicted entries stay alive as long as a label shows them
+
+    def store(self, curve_id, image):
+        """PhotoImage (created on the Tk thread) of a decoded image, cached within max_bytes"""
+        photo = None if image is None else ImageTk.PhotoImage(image)
+        size  = 0 if image is None else 2*4*image.size[0]*image.size[1]  # PIL and Tk copies
+        self.entries[curve_id] = (size, image, photo)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            self.nbytes -= self.entries.popitem(last=False)[1][0]
+        return photo
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 class AreaPtr:
      def __init__(self, areaID):
@@ -361,14 +413,44 @@ class ControlPanel:
             self.set_values()
             
         if   self.what == 'curve':
-          self.shared_item.set_param(self.param, self.act_value)
-          self.shared_item.calculate(self.addIncr)
+          # Computed and published by a worker, the panel only posts the new value
+          compute.scheduler.submit(self.shared_item, self.param, self.act_value, self.addIncr)
+          self.precompute_ahead()
         elif self.what == 'system':
           self.shared_item.set_param(self.param, self.act_value)
           self.shared_item.calculate() 
         else:
           print("Wrong passed type")
 
+    def precompute_ahead(self):
+        """Queue the next animation values (or both neighbours) for background computation"""
+        if self.addIncr:
+            return  # stepping t extends the current trajectory, there is nothing to compute ahead
+        direction = {'left': -1, 'right': 1}.get(self.animating, 0)
+        values = compute.precomputer.ahead(self.act_value, self.step, direction, self.min_value, self.max_value)
+        compute.precomputer.prefetch(self.shared_item, self.param, values)
+
+    def export_animation(self):
+        """Export the forward animation from the current value up to the maximum into a file"""
+        path = filedialog.asksaveasfilename(parent=self.parent_frame, defaultextension='.gif',
+                                            filetypes=[('Animated GIF', '*.gif'), ('Animated WebP', '*.webp'), ('PNG frames', '*.png')])
+        if not path:
+            return
+        window = self.parent_frame.winfo_toplevel().pygame_instance
+        # Steps below the maximum as in increase_value; the tolerance keeps rounding from dropping
+        # the last step (3.9999 steps) or adding one at the maximum itself
+        Nsteps = int(np.floor((self.max_value - self.act_value)/self.step + 1e-9))
+        values = [self.act_value + self.step*k for k in range(1, Nsteps + 1)]
+        if values and values[-1] >= self.max_value - 1e-9*self.step:
+            values.pop()
+
+        def run_export():
+            try:
+                export.Export_window(window, self.shared_item, self.param, values, path, increment=self.addIncr)
+            except Exception as e:
+                print(f"Exporting {self.shared_item.name} failed: {e}")
+        threading.Thread(target=run_export, daemon=True).start()
+
     def show_properties(self):
         self.popup = tk.Toplevel(self.parent_frame)
         self.popup.title(f"Properties for {self.param}")
@@ -490,6 +572,8 @@ class ControlPanel:
                                     command=self._reset_limits)
         self.context_menu.add_separator()
         self.context_menu.add_command(label="Copy Value", command=self._copy_value)
+        if self.what == 'curve':
+            self.context_menu.add_command(label="Export Animation...", command=self.export_animation)
         
         # Bind right-click to all relevant widgets
         for widget in [self.value_label, self.decrease_button, self.increase_button, self.slider]:
@@ -743,6 +827,8 @@ class TkinterWindow(tk.Tk):
         self.ControlWindow_w = cWinW
         self.ControlWindow_h = cWinH
         self.db_path = 'curves.db'
+        self.catalog = catalog.Open(self.db_path)
+        self.formula_images = FormulaImages(self.catalog, int(0.7*cWinW), 120)
         
         self.DisplayWindow = dWin
         
@@ -793,18 +879,13 @@ class TkinterWindow(tk.Tk):
         self.curve_listbox.bind("<Double-Button-1>", self.on_curve_listbox_double_click)
         
     def populate_listbox(self):
-        connection = sqlite3.connect(self.db_path)
-        cursor = connection.cursor()
-        cursor.execute("SELECT id, name FROM curves")
-        rows = cursor.fetchall()
+        rows = self.catalog.list_curves()
 
         self.curve_map = {}  # Map to store curve ID by listbox index
         for index, row in enumerate(rows):
             curve_id, curve_name = row
             self.curve_map[index] = curve_id
             self.curve_listbox.insert(tk.END, curve_name)
-
-        connection.close()
         
     def on_curve_listbox_double_click(self, event):
         def adding_curve_wraper(toScale=False):
@@ -820,61 +901,18 @@ class TkinterWindow(tk.Tk):
 
         curve_id = self.curve_map[selected_index[0]]
 
-        connection = sqlite3.connect(self.db_path)
-        cursor = connection.cursor()
-
-        curveSQL = f"SELECT ID, name, className, color, thickness, parametric, formula, radians, also3d, scale FROM curves WHERE ID={curve_id};"
-        curves = cursor.execute(curveSQL).fetchall()
-        curve_record    = curves[0]
-        curve_id        = curve_record[0]
-        curve_name      = curve_record[1]
-        class_name      = curve_record[2]
-        curve_color     = curve_record[3]
-        curve_thickness = curve_record[4]
-        parametric      = int(curve_record[5])
-        formula_png     = curve_record[6]
-        t_in_radians    = curve_record[7]
-        is_3d           = curve_record[8]
-        scale           = curve_record[9]
-        
-        if formula_png: formula = Image.open(io.BytesIO(formula_png))
-        else:           formula = ""
+        curve_record, gotParams = self.catalog.read_curve(curve_id)
+        curve_id        = curve_record.ID
+        class_name      = curve_record.className
+        is_3d           = curve_record.also3d
+        scale           = curve_record.scale
             
         if hasattr(funs, class_name):
-            paramSQL = f"SELECT param, type, magnitude, valMin, valMax, val0, incr, Npoints FROM params WHERE curve_id={curve_id};"
-            params = cursor.execute(paramSQL).fetchall()
-            gotParams = {}
-            tMin  =  0.0
-            tMax  = 10.0
-            tIncr =  1.0
-            tPts  = 10 
-            for paramSet in params:
-                paramName = paramSet[0]
-                paramType = paramSet[1]
-                magnitude = float(paramSet[2])
-                if paramName == 't' and t_in_radians: magnitude *= 3.14159265358979323846
-                    
-                if paramType == 1:
-                  defMin = 0.0
-                else:
-                  defMin = -magnitude
-                defMax = magnitude
-                
-                actMin = defMin*paramSet[3]
-                actMax = defMax*paramSet[4]
-                actVal = paramSet[5]
-                
-                incr   = paramSet[6]
-                nPts   = paramSet[7]
-
-                gotParams[paramName] = [defMin, defMax, actMin, actMax, actVal, incr, nPts]
-
             new_curve = False
             if curve_id in self.curve_instances:
                 curveInstance = self.curve_instances[curve_id]
             else:
-                curveClass = getattr(funs, class_name)  # Get the class by name
-                curveInstance = curveClass(name=curve_name, color=curve_color, thickness=curve_thickness, is_parametric=parametric, formula=formula, inpParams=gotParams)
+                curveInstance = catalog.Create_curve(curve_record, gotParams)
                 new_curve = True
                 self.curve_instances[curve_id] = curveInstance
                 self.curve_sets[curve_id] = {}
@@ -948,31 +986,16 @@ class TkinterWindow(tk.Tk):
                 self.update_controls()
         else:
             print(f"Class {class_name} not found in module 'funs'.")
-        connection.close()
         self.manage_areas_controls()
        
     def add_curve_to_area(self, area_index, adding_curve_curves, set_sets, uniform = True):
-        if type(adding_curve_curves) == list:
-            self.pygame_instance.Areas[area_index].curves.extend(adding_curve_curves)
-            for curve in adding_curve_curves:
-                if curve not in self.pygame_instance.Areas[area_index].diags:
-                    self.pygame_instance.Areas[area_index].diags[curve] = []
-            if set_sets not in self.pygame_instance.Areas[area_index].diags[adding_curve_curves]:
-                self.pygame_instance.Areas[area_index].diags[adding_curve_curves].extend(set_sets)
-        else:
-            if adding_curve_curves not in self.pygame_instance.Areas[area_index].curves:
-                self.pygame_instance.Areas[area_index].curves.append(adding_curve_curves)
-            if adding_curve_curves not in self.pygame_instance.Areas[area_index].diags:
-                self.pygame_instance.Areas[area_index].diags[adding_curve_curves] = []
-                
-            if type(set_sets) == list:
-                for set in set_sets:
-                    if set not in self.pygame_instance.Areas[area_index].diags[adding_curve_curves]:
-                        self.pygame_instance.Areas[area_index].diags[adding_curve_curves].append(set)
-            else:
-                if set_sets not in self.pygame_instance.Areas[area_index].diags[adding_curve_curves]:
-                    self.pygame_instance.Areas[area_index].diags[adding_curve_curves].append(set_sets)
-        self.pygame_instance.Areas[area_index].set_scale(uniform)
+        # Area.add_curve swaps in new containers, the pygame thread may be drawing the old ones
+        area = self.pygame_instance.Areas[area_index]
+        adding_curves = adding_curve_curves if type(adding_curve_curves) == list else [adding_curve_curves]
+        sets = set_sets if type(set_sets) == list else [set_sets]
+        for curve in adding_curves:
+            area.add_curve(curve, sets)
+        area.set_scale(uniform)
     
     def add_controls(self):
         for curve_id, curve in self.curve_instances.items():
@@ -1026,13 +1049,10 @@ class TkinterWindow(tk.Tk):
             params_frame = tk.Frame(curve_frame)
             params_frame.pack(side=tk.TOP, fill=tk.X)
 
-            # Formula image display in the right column
-            if curve.formula:
-                formula_image_tk = ImageTk.PhotoImage(curve.formula)
-                #formula_image_tk = Resize_formula_image(curve.formula)
-                formula_image_label = tk.Label(right_column, image=formula_image_tk)
-                formula_image_label.image = formula_image_tk
-                formula_image_label.pack(side=tk.LEFT, padx=5)
+            # Formula image display in the right column, filled in once it is decoded
+            formula_image_label = tk.Label(right_column)
+            formula_image_label.pack(side=tk.LEFT, padx=5)
+            self.formula_images.show(formula_image_label, curve_id)
 
             # Handling parameter frames dynamically
             ancor_frame = params_frame
@@ -1164,9 +1184,7 @@ class TkinterWindow(tk.Tk):
     def delete_curve_frame(self, curve_frame, toDel_curve, curveID):
         for area_id, area in self.pygame_instance.Areas.items():
             if toDel_curve in area.curves:
-                if toDel_curve in area.diags:
-                    del area.diags[toDel_curve]
-                area.curves.remove(toDel_curve) 
+                area.remove_curve(toDel_curve)
 
         if curveID in self.curve_frames:
             del self.curve_frames[curveID]
@@ -1207,6 +1225,7 @@ class TkinterWindow(tk.Tk):
         curve.color = color  # Update the curve's color
         curve.thickness = thickness 
         curve.props[set_id] = color, thickness
+        self.pygame_instance.invalidate_areas(curve)
 
         current_canvas.itemconfig(line_id,
                                   fill=self.line_properties[line_id]["color"],
@@ -1218,6 +1237,7 @@ class TkinterWindow(tk.Tk):
     def on_closing(self):
         print("Tkinter window closing...")
         self.pygame_instance.running = False
+        self.formula_images.shutdown()
         self.quit()  # Properly stop the Tkinter main loop
 
 def configure_styles():
@@ -0,0 +1,727 @@
+import numpy as np
+import pygame
+import threading
+
+from collections import OrderedDict
+
+import funs
+import cache
+import compute
+
+from funs import area_colors
+
+def Calculate_denominators():
+  nasobky = [2.0, 1.25, 2.0, 2.0]
+  denom1 = [1]
+  denom2 = [1]
+  for i in range(20):
+    for nasobok in nasobky:
+      new_val = denom1[-1]*nasobok
+      denom1.append(new_val)
+    for nasobok in list(reversed(nasobky)):
+      new_val = denom2[-1]/nasobok
+      denom2.append(new_val)
+
+  #denoms = list(reversed(denom1[1:])) + denom2
+  denoms = list(reversed(denom1)) + denom2[1:]
+  #denoms = list(reversed(denom1[1:])) + denom2[1:]
+  return denoms
+
+def Diag_series(t_vec, xyz, diag, up_idx):
+  # (N, 2) real coordinates of a diagram such as 'xy', 'tx' or 'tz'
+  columns = [t_vec[:up_idx] if axis == 't' else xyz[:up_idx, 'xyz'.index(axis)] for axis in diag]
+  return np.column_stack(columns)
+
+def Decimate_indices(screen_coords):
+  # Min/max-per-bucket decimation: a bucket is a run of consecutive points falling
+  # into the same pixel column; only its first, last, lowest and highest points are
+  # kept, so the drawn polyline is unchanged at pixel resolution and peaks survive.
+  cols = screen_coords[:,0]
+  rows = screen_coords[:,1]
+  Npts = len(cols)
+  starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]])
+  ends   = np.r_[starts[1:], Npts] - 1
+  run_id = np.repeat(np.arange(len(starts)), ends - starts + 1)
+
+  at_min = np.flatnonzero(rows == np.minimum.reduceat(rows, starts)[run_id])
+  at_max = np.flatnonzero(rows == np.maximum.reduceat(rows, starts)[run_id])
+  first_min = at_min[np.unique(run_id[at_min], return_index=True)[1]]
+  first_max = at_max[np.unique(run_id[at_max], return_index=True)[1]]
+  return np.unique(np.concatenate((starts, ends, first_min, first_max)))
+
+def Visible_runs(points, xmin, xmax, ymin, ymax):
+  # Split a polyline into runs of consecutive segments whose bounding boxes meet the rectangle
+  x0, x1 = points[:-1,0], points[1:,0]
+  y0, y1 = points[:-1,1], points[1:,1]
+  hit = (np.minimum(x0, x1) <= xmax) & (np.maximum(x0, x1) >= xmin) & (np.minimum(y0, y1) <= ymax) & (np.maximum(y0, y1) >= ymin)
+  if hit.all():
+    return [points]
+  edges  = np.diff(np.r_[0, hit.astype(np.int8), 0])
+  starts = np.flatnonzero(edges == 1)
+  stops  = np.flatnonzero(edges == -1)  # segments starts..stops-1 join points starts..stops
+  return [points[start:stop+1] for start, stop in zip(starts, stops)]
+
+def Label_digits(incr):
+  # Number of decimals needed to tell apart labels spaced by incr
+  add_factor = 0 if incr >= 1 else 1
+  adiff = incr
+  for factor in range(1,10000):
+    adiff *= 10
+    if adiff > 1:
+      break
+  return factor + add_factor
+
+class LabelCache:
+    # LRU cache of rendered label surfaces; tick labels only change on zoom
+    def __init__(self, max_items = 1024):
+        self.max_items = max_items
+        self.surfaces  = OrderedDict()
+        self.lock      = threading.Lock()  # shared by the window and export renderers on other threads
+        
+    def render(self, font, text, color):
+        key = (text, color, font)
+        with self.lock:
+            surface = self.surfaces.get(key)
+            if surface is None:
+                surface = font.render(text, True, color)
+                self.surfaces[key] = surface
+                if len(self.surfaces) > self.max_items:
+                    self.surfaces.popitem(last=False)
+            else:
+                self.surfaces.move_to_end(key)
+            return surface
+
+class Ticks:
+    def __init__(self):
+        self.Nmin = 5
+        self.Navg = 10
+        self.Nmax = 15
+
+class Axis:
+    def __init__(self):
+        self.incr   = 10.0
+        self.digits = 1  # decimals shown in tick labels, follows incr
+        self.tikcs  = Ticks()
+
+class Area():
+    def __init__(self, inpID = 0, x0 = 0, y0 = 0, axisLines=[], denominators = [], width=100, height=100, margin=0, color = 'white', screen=None, font=None, in3d=False, antialias=False):
+        self.E0      = np.array([x0, y0], dtype=np.int32)
+        self.w       = width
+        self.h       = height
+        self.margin  = margin
+        self.color   = color
+        self.ID      = inpID
+        
+        self.R0 = np.array([self.w//2, self.h//2], dtype=np.int32)
+
+        # Scaling factor
+        self.scale    = 1.0  
+        self.scaleX, self.scaleY = 1.0, 1.0 
+        
+        self.dragging_curve = None  # Track the currently dragged curve
+        self.dragging_all   = False
+        
+        self.screen = screen
+        self.font   = font
+        
+        #self.lock = lck
+        
+        self.revy = np.array([1.0, -1.0])
+        self.tick = 5
+        
+        self.Xaxis, self.Yaxis, self.Zaxis = Axis(), Axis(), Axis()
+        self.Xlabels, self.Ylabels, self.Zlabels = [], [], []
+        self.denominators = denominators
+
+        self.curves  = []
+        self.diags   = {}
+        
+        self.systems = axisLines
+        
+        self.in3d = in3d
+        self.rotation_matrix = np.eye(3)
+        
+        self.antialias = antialias
+        
+        # Redraw on demand: set by zoom/pan/scale changes, curve data changes are seen through revisions
+        self.dirty           = True
+        self.drawn_revisions = {}
+        
+        # Level of detail: series longer than lod_factor points per pixel column are decimated
+        self.lod        = True
+        self.lod_factor = 4
+        self.lod_cache  = {}
+        
+        # Off-screen layer with grid, labels and axes, rebuilt on zoom and scrolled on pan
+        self.background       = None
+        self.background_stamp = None
+        self.background_R0    = None
+        
+    def get_screen_coords(self, inp_coords):
+        screen_coords = self.E0 + self.R0 + inp_coords * np.array([self.scaleX, self.scaleY]) * self.revy
+        # floor rather than truncate, so whole-pixel pans shift every point by exactly the same amount
+        return np.floor(screen_coords).astype(np.int32)
+        
+    def get_real_coords(self, screen_point):
+        scaled_coords = (np.array(screen_point) - self.R0 - self.E0) / np.array([self.scaleX, self.scaleY])
+        # Flip the y-coordinate by multiplying by [-1, 1]
+        return scaled_coords * self.revy
+        
+    def get_rect(self):
+        return pygame.Rect(self.E0[0], self.E0[1], self.w - self.margin, self.h)
+        
+    def invalidate(self):
+        self.dirty = True
+        
+    def add_curve(self, curve, diags):
+        # Copy-on-write: the pygame thread keeps iterating the previous list/dict undisturbed
+        new_diags = dict(self.diags)
+        new_diags[curve] = list(new_diags.get(curve, [])) + [diag for diag in diags if diag not in new_diags.get(curve, [])]
+        self.diags = new_diags
+        if curve not in self.curves:
+            self.curves = self.curves + [curve]
+        
+    def remove_curve(self, curve):
+        self.curves = [shown for shown in self.curves if shown is not curve]
+        self.diags  = {shown: diags for shown, diags in self.diags.items() if shown is not curve}
+        
+    def get_shown(self):
+        # (curve, diags) pairs; diags is read first, so a curve added or removed meanwhile is skipped
+        diags = self.diags
+        return [(curve, diags[curve]) for curve in self.curves if curve in diags]
+        
+    def needs_redraw(self):
+        if self.dirty:
+            return True
+        curves = list(self.curves)
+        return len(curves) != len(self.drawn_revisions) or any(self.drawn_revisions.get(curve) != curve.revision for curve in curves)
+        
+    def zoom(self, mouse_pos, zoom_factor):
+        real_pos = self.get_real_coords(mouse_pos)
+        self.scaleX = self.scaleX * zoom_factor
+        self.scaleY = self.scaleY * zoom_factor
+
+        new_screen_pos = self.get_screen_coords(real_pos)  # Already a NumPy array
+ 
+        delta_shift = new_screen_pos - mouse_pos
+        self.R0 = self.R0 - delta_shift
+        self.recalculate_grids()
+        self.invalidate()
+        
+    def pan(self, delta_pos):
+        self.R0 = self.R0 + delta_pos
+        self.invalidate()
+        
+    def get_visible_rect(self, pad = 4):
+        # Real-coordinate bounds of the area (plus a few pixels for line thickness)
+        corner1 = self.get_real_coords(self.E0 - pad)
+        corner2 = self.get_real_coords(self.E0 + np.array([self.w - self.margin, self.h]) + pad)
+        xmin, xmax = sorted((corner1[0], corner2[0]))
+        ymin, ymax = sorted((corner1[1], corner2[1]))
+        return xmin, xmax, ymin, ymax
+    
+    def get_diag_polylines(self, curve, snapshot, diag, visible_rect):
+        # Polylines of every member (ensemble curves have many) for one diagram. The runs crossing
+        # the viewport are found first and only they are projected and decimated, so a zoomed-in
+        # view costs what it shows
+        up_idx = snapshot.up_idx
+        budget = self.lod_factor * self.w
+        polylines = []
+        for mi, member in enumerate(snapshot.members):
+            series = Diag_series(snapshot.t_vec, member, diag, up_idx)
+            runs   = Visible_runs(series, *visible_rect)
+            if not self.lod or sum(len(run) for run in runs) <= budget:
+                polylines += [self.get_screen_coords(run) for run in runs]
+            elif runs[0] is series:
+                # All of it in view: decimation does not depend on R0 (panning shifts whole pixel
+                # columns), so the reduced series is reused until the data or the zoom changes
+                stamp  = (snapshot.revision, up_idx, self.scaleX, self.scaleY)
+                cached = self.lod_cache.get((curve, diag, mi))
+                if cached is None or cached[0] != stamp:
+                    kept   = series[Decimate_indices(self.get_screen_coords(series))]
+                    cached = self.lod_cache[(curve, diag, mi)] = (stamp, kept)
+                polylines.append(self.get_screen_coords(cached[1]))
+            else:
+                for run in runs:
+                    screen_coords = self.get_screen_coords(run)
+                    if len(run) > budget:
+                        screen_coords = screen_coords[Decimate_indices(screen_coords)]
+                    polylines.append(screen_coords)
+        return polylines
+        
+    def draw_polyline(self, color, points, thickness = 1, surface = None):
+        # One batched call per polyline instead of one pygame.draw.line per segment
+        if len(points) < 2:
+            return
+        if surface is None:
+            surface = self.screen
+        if self.antialias:
+            # aalines has no width, so thicker lines are built from shifted hairlines
+            shifts = [(0, 0)] + [(s, 0) for s in range(1, thickness)] + [(0, s) for s in range(1, thickness)]
+            for shift in shifts:
+                pygame.draw.aalines(surface, color, False, points + shift)
+        else:
+            pygame.draw.lines(surface, color, False, points, thickness)
+                
+    def render_background(self, surface):
+        # Grid, labels and axes in the surface's own coordinates (area corner at 0, 0)
+        offset = -self.E0
+        def Draw_labels(inp_labels, axis_vector, tick_vector, tick_span, factor, axis_line_color = "black", axis_font_color="blue", middle_label = True):
+          if len(inp_labels) == 0:
+            return
+          Nminor = 5
+          minor_span = tick_span/Nminor
+          baseG = 200
+          thinG = baseG + 25
+          major_color = (baseG, baseG, baseG)
+          minor_color = (thinG, thinG, thinG)
+          
+          # Skip ticks outside the area; keep some room for labels straddling its edge
+          all_screen_coords = self.get_screen_coords(inp_labels)
+          along  = all_screen_coords @ axis_vector
+          lowest = self.E0 @ axis_vector - label_pad
+          extent = np.array([self.w - self.margin, self.h]) @ axis_vector + 2*label_pad
+          visible = (along >= lowest) & (along <= lowest + extent)
+          for Pos, screen_coords in zip(inp_labels[visible], all_screen_coords[visible] + offset):
+            if np.linalg.norm(Pos) != 0.0 or middle_label:
+                renderLabel = label_cache.render(self.font, f"{np.sum(Pos):.{factor}f}", axis_font_color)
+                surface.blit(renderLabel, (screen_coords + tick_vector))
+
+            #pygame.draw.line(surface, axis_line_color, (screen_coords - tick_vector*self.tick), (screen_coords + tick_vector*self.tick), 1)
+            pygame.draw.line(surface, major_color, (screen_coords - tick_vector*aDim), (screen_coords + tick_vector*aDim), 1)
+            ''' 
+            for mi in range(1,Nminor):
+                mPos = Pos + mi*minor_span*axis_vector
+                m_screen_coords = self.get_screen_coords(mPos) + offset
+                #print(mPos, m_screen_coords, tick_vector*aDim)
+                pygame.draw.line(surface, minor_color, (m_screen_coords - tick_vector*aDim), (m_screen_coords + tick_vector*aDim), 1)
+            '''
+            
+        surface.fill(self.color)
+        Draw_labels(self.Xlabels, np.array((1.0, 0.0)), np.array((0.0, 1.0)), self.Xaxis.incr, self.Xaxis.digits)
+        Draw_labels(self.Ylabels, np.array((0.0, 1.0)), np.array((1.0, 0.0)), self.Yaxis.incr, self.Yaxis.digits, middle_label = False)
+        
+        visible_rect = self.get_visible_rect()
+        for shared_system in self.systems:
+            for curve in shared_system.curves:
+                act_color, act_thickness = curve.props['xy']
+                for screen_coors in self.get_diag_polylines(curve, curve.get_snapshot(), 'xy', visible_rect):
+                    self.draw_polyline(act_color, screen_coors + offset, act_thickness, surface)
+                    
+    def update_background(self):
+        # The background only depends on the view; R0 is handled separately so panning can scroll it
+        size  = (self.w - self.margin, self.h)
+        stamp = (size, self.scaleX, self.scaleY, self.Xaxis.incr, self.Yaxis.incr, self.color, self.antialias)
+        if self.background is None or stamp != self.background_stamp:
+            self.background = pygame.Surface(size, 0, self.screen)
+            self.render_background(self.background)
+        else:
+            shift = self.R0 - self.background_R0
+            if not np.any(shift):
+                return
+            dx, dy = int(shift[0]), int(shift[1])
+            if (dx, dy) != tuple(shift) or abs(dx) >= size[0] or abs(dy) >= size[1]:
+                self.render_background(self.background)
+            else:
+                # Move the cached pixels and paint only the uncovered strips
+                self.background.scroll(dx, dy)
+                strips = []
+                if   dx > 0: strips.append(pygame.Rect(0, 0, dx, size[1]))
+                elif dx < 0: strips.append(pygame.Rect(size[0] + dx, 0, -dx, size[1]))
+                if   dy > 0: strips.append(pygame.Rect(0, 0, size[0], dy))
+                elif dy < 0: strips.append(pygame.Rect(0, size[1] + dy, size[0], -dy))
+                for strip in strips:
+                    self.background.set_clip(strip)
+                    self.render_background(self.background)
+                self.background.set_clip(None)
+        self.background_stamp = stamp
+        self.background_R0    = np.array(self.R0)
+                
+    def draw(self):
+        # Snapshots are taken before drawing, so data published meanwhile triggers another redraw
+        self.dirty = False
+        shown = self.get_shown()
+        snapshots = {curve: curve.get_snapshot() for curve, diags in shown}
+        self.drawn_revisions = {curve: snapshot.revision for curve, snapshot in snapshots.items()}
+        
+        graphics_area = self.get_rect()
+        self.screen.set_clip(graphics_area)
+        
+        if self.in3d:
+            pygame.draw.rect(self.screen, self.color, graphics_area)
+            self.all_curves = [curve for shared_system in self.systems for curve in shared_system.curves] # + [curve for curve in self.curves] 
+            for curve in self.all_curves:  
+                if len(curve.r_vec) > 1: #break 
+                    screen_coors = self.get_screen_coords3d(curve.r_vec)
+                    self.draw_polyline(curve.color, screen_coors, curve.thickness)
+        else:
+            # Curves are drawn on top of the cached axes/grid/labels layer
+            self.update_background()
+            self.screen.blit(self.background, self.E0)
+            
+            self.all_curves = shown
+            visible_rect = self.get_visible_rect()
+            for curve, diags in self.all_curves:  
+               snapshot = snapshots[curve]
+               if np.count_nonzero(np.any(snapshot.xyz[:snapshot.up_idx] != 0, axis=1)) > 1:  
+                  for diag in diags:
+                    act_color, act_thickness = curve.props[diag]
+                    for screen_coors in self.get_diag_polylines(curve, snapshot, diag, visible_rect):
+                        self.draw_polyline(act_color, screen_coors, act_thickness)
+                        
+                    '''
+                    last_point = screen_coors[-1]
+                    circle_radius = 5  # Set the radius of the circle
+                    outline_thickness = 2  # Set the thickness of the outline
+                    
+                    pygame.draw.circle(self.screen, curve.color, last_point, circle_radius)
+                    # Drawing the circle with only the outline
+                    pygame.draw.circle(self.screen, curve.color, last_point, circle_radius+outline_thickness, outline_thickness)
+                    '''
+            
+            # Forget decimated series of curves no longer shown in this area (or of dropped members)
+            shown = {(curve, diag) for curve, diags in self.all_curves for diag in diags}
+            for key in [key for key in self.lod_cache if key[:2] not in shown or key[2] >= len(snapshots[key[0]].members)]:
+                del self.lod_cache[key]
+        
+    def set_scale(self, equal = True):
+        all_x = []
+        all_y = []
+        for ci, (curve, diags) in enumerate(self.get_shown()):
+          snapshot = curve.get_snapshot()
+          members = snapshot.members[:, :snapshot.up_idx]  # buffers of stepped ODE curves are longer than the computed part
+          for diag in diags:
+            #diag_type = self.diags[ci]
+            diag_type = diag
+            if   diag_type[0] == 'x':
+                #all_x.append(curve.x_vec)
+                all_x.append(np.min(members[:,:,0]))
+                all_x.append(np.max(members[:,:,0]))
+            elif diag_type[0] == 't':
+                #all_x.append(curve.t_vec)
+                all_x.append(np.min(snapshot.t_vec[:snapshot.up_idx]))
+                all_x.append(np.max(snapshot.t_vec[:snapshot.up_idx]))
+                
+            if   diag_type[1] == 'x':
+                #all_y.append(curve.x_vec)
+                all_y.append(np.min(members[:,:,0]))
+                all_y.append(np.max(members[:,:,0]))
+            elif diag_type[1] == 'y':
+                #all_y.append(curve.y_vec)
+                all_y.append(np.min(members[:,:,1]))
+                all_y.append(np.max(members[:,:,1]))
+            elif diag_type[1] == 'z':
+                #all_y.append(curve.z_vec)
+                all_y.append(np.min(members[:,:,2]))
+                all_y.append(np.max(members[:,:,2]))
+
+        all_x.append(0.0)
+        all_y.append(0.0)
+        if all_x and all_y:
+            self.min_x = min(float('inf'), min(all_x))
+            self.max_x = max(float('-inf'), max(all_x))
+            self.min_y = min(float('inf'), min(all_y))
+            self.max_y = max(float('-inf'), max(all_y))
+            
+            #print(f"MinMax for area {self.ID}",  self.min_x, self.max_x, self.min_y, self.max_y)
+            spanX = (self.max_x - self.min_x)*1.2 
+            self.scaleX = self.w/2.0 if spanX == 0.0 else self.w/spanX
+            
+            spanY = (self.max_y - self.min_y)*1.2
+            self.scaleY = self.h/2.0 if spanY == 0.0 else self.h/spanY
+           
+            if equal:
+              self.scale = min(self.scaleX, self.scaleY)
+              self.scaleX, self.scaleY = self.scale, self.scale
+              
+            middleX = (self.max_x + self.min_x)/2.0 
+            middleY = (self.max_y + self.min_y)/2.0 
+            self.R0 = np.array([self.w//2, self.h//2], dtype=np.int32) + [-middleX*self.scaleX, middleY*self.scaleY]
+ 
+        self.recalculate_grids()
+        self.invalidate()
+            
+    def recalculate_grids(self):
+        for denominator in self.denominators:
+            if self.w/self.scaleX/denominator >= 10.0:
+                self.Xaxis.incr = denominator
+                break
+                
+        for denominator in self.denominators:
+            if self.h/self.scaleY/denominator >= 10.0:
+                self.Yaxis.incr = denominator
+                break
+                
+        self.make_grids()
+        
+    def make_grids(self):
+        if self.in3d:
+            Xlabels_list = [[wi * self.Xaxis.incr, 0.0, 0.0] for wi in range(-100, 101)]
+            Ylabels_list = [[0.0, wi * self.Yaxis.incr, 0.0] for wi in range(-100, 101)]
+            Zlabels_list = [[0.0, 0.0, wi * self.Zaxis.incr] for wi in range(-100, 101)]
+            self.Xlabels = np.array(Xlabels_list)
+            self.Ylabels = np.array(Ylabels_list)
+            self.Zlabels = np.array(Zlabels_list)
+        else:
+            self.Xaxis.digits = Label_digits(self.Xaxis.incr)
+            self.Yaxis.digits = Label_digits(self.Yaxis.incr)
+            Xlabels_list = [[wi * self.Xaxis.incr, 0.0] for wi in range(-100, 101)]
+            Ylabels_list = [[0.0, wi * self.Yaxis.incr] for wi in range(-100, 101)]
+            self.Xlabels = np.array(Xlabels_list)
+            self.Ylabels = np.array(Ylabels_list)
+            # Remove the origin point from Ylabels if required
+            #self.Ylabels = self.Ylabels[np.any(self.Ylabels != [0.0, 0.0], axis=1)]
+
+class PygameWindow():
+    def __init__(self, tkinter_instance, denoms, axisLines, width=800, height=800, margin=0, axis3dLines = [], max_fps=60, idle_fps=20):
+        self.tkinter_instance = tkinter_instance  # Store the Tkinter instance
+        
+        self.Xlen = width
+        self.Ylen = height
+
+        self.zoom_in  = 1.1
+        self.zoom_out = 1/1.1
+
+        self.revy   = np.array([1.0, -1.0])
+        self.Areas  = {}
+        self.denoms = denoms
+        self.aLines = axisLines
+        self.a3DLines = axis3dLines
+        
+        self.screen = None
+        self.a_font = None
+        
+        self.antialias = False  # toggled with the 'a' key
+        
+        self.max_fps  = max_fps   # cap while areas keep changing
+        self.idle_fps = idle_fps  # polling rate for changes while nothing is redrawn
+        self.layout_changed = True
+        
+        self.running = True
+
+    def arrange_areas(self, style = 1):
+        def append_area(aID, x1, y1, inpW, inpH, color=(255,255,255)):
+            areas[aID] = Area(aID, x1, y1, self.aLines, self.denoms, inpW, inpH, color=color, screen=self.screen, font=self.a_font, antialias=self.antialias)
+            #self.Areas[aID] = Area(aID, x1, y1, self.a3DLines, self.denoms, inpW, inpH, color=color, screen=self.screen, font=self.a_font, in3d=True)
+
+        areas = {}
+        if   style == 1:
+            Xlen = self.Xlen
+            Ylen = self.Ylen
+            append_area(1, 0,  0   , Xlen, Ylen, area_colors[1])
+        elif style == 2:
+            Xlen = self.Xlen
+            Ylen = self.Ylen//2
+            append_area(1, 0,  0   , Xlen, Ylen, area_colors[1])
+            append_area(2, 0,  Ylen, Xlen, Ylen, area_colors[2])
+        elif style == 3:
+            Xlen = self.Xlen
+            Ylen = self.Ylen//3
+            append_area(1, 0,      0, Xlen, Ylen, area_colors[1])
+            append_area(2, 0,   Ylen, Xlen, Ylen, area_colors[2])
+            append_area(3, 0, 2*Ylen, Xlen, Ylen, area_colors[3])
+        elif style == 4:
+            Xlen = self.Xlen//2
+            Ylen = self.Ylen//2
+            append_area(1, 0,       0, Xlen, Ylen, area_colors[1])
+            append_area(2, Ylen,    0, Xlen, Ylen, area_colors[2])
+            append_area(3, 0,    Ylen, Xlen, Ylen, area_colors[3])
+            append_area(4, Ylen, Ylen, Xlen, Ylen, area_colors[4])
+        
+        # Swap the whole dict, the render loop may be iterating over the old one
+        self.Areas = areas
+        self.layout_changed = True
+
+    def set_antialias(self, enabled):
+        self.antialias = enabled
+        for area in self.Areas.values():
+            area.antialias = enabled
+        self.invalidate_areas()
+
+    def invalidate_areas(self, curve = None):
+        # Mark for redraw all areas, or only those showing the given curve
+        for area in list(self.Areas.values()):
+            if curve is None or curve in area.curves:
+                area.invalidate()
+
+    def get_active_area(self, pos):
+        x, y = pos
+        for area in self.Areas.values():
+            # Check if pos is within the bounds of the Area
+            if (area.E0[0] <= x < area.E0[0] + area.w) and (area.E0[1] <= y < area.E0[1] + area.h):
+                return area
+        return None
+
+    def start(self):
+        pygame.init()        
+        pygame.display.set_caption("2D Visual")
+
+        self.screen = pygame.display.set_mode((self.Xlen, self.Ylen))
+        self.a_font = pygame.font.Font(None, 14)  # Default font 
+        self.arrange_areas(1)
+        
+        clock = pygame.time.Clock()
+        dragging_all   = False
+        dragging_curve = False
+        last_mouse_pos = (0, 0)
+
+        active_area  = None  # To track which Area is being interacted with
+        area_changed = False
+        
+        dragging_rotate = False
+
+        self.running = True
+        # Pygame main loop
+        while self.running:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    print("Pygame window closing...")
+                    self.running = False  # Set running to False to stop both windows
+                    
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.layout_changed = True
+                    
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        self.running = False  # Set running to False to stop both windows
+                    elif event.key == pygame.K_a:
+                        self.set_antialias(not self.antialias)
+                        
+                elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION):
+                    new_active_area = self.get_active_area(event.pos)
+                    if new_active_area != active_area:
+                        area_changed = True
+                        active_area  = new_active_area
+                    else:
+                        area_changed = False
+
+                    if active_area is not None:
+                        if event.type == pygame.MOUSEBUTTONDOWN:
+                            if   event.button == 1:  # Left mouse button
+                                dragging_rotate = True
+                                last_mouse_pos = event.pos
+                            elif event.button == 2:  # Middle mouse button
+                                dragging_all = True
+                                last_mouse_pos = event.pos  # Get the current mouse position
+                            elif event.button == 3: # Right mouse button
+                                real_pos = active_area.get_real_coords(event.pos)
+                                '''
+                                if active_area.handle_mouse_button_down(real_pos):
+                                    dragging_curve = True
+                                    last_mouse_pos = event.pos
+                                '''
+                            elif event.button == 4:  # Scroll up (zoom in)
+                                active_area.zoom(event.pos, self.zoom_in)
+                            elif event.button == 5:  # Scroll down (zoom out)
+                                active_area.zoom(event.pos, self.zoom_out)
+                                
+                        elif event.type == pygame.MOUSEMOTION:
+                            if area_changed:
+                                dragging_all = False
+                                dragging_curve = False
+                                
+                            if dragging_all:
+                                current_mouse_pos = pygame.mouse.get_pos()
+                                delta_pos = np.array(current_mouse_pos) - np.array(last_mouse_pos)
+                                if np.any(np.abs(delta_pos) > 0):
+                                  active_area.pan(delta_pos)
+                                last_mouse_pos = current_mouse_pos  # Update the last mouse position
+                                
+                            if dragging_rotate:
+                                # Calculate mouse drag delta
+                                current_mouse_pos = pygame.mouse.get_pos()
+                                delta_pos = np.array(current_mouse_pos) - np.array(last_mouse_pos)
+                                
+                                # Compute a rotation angle based on mouse movement
+                                angle_x = np.radians(delta_pos[1] * 0.5)  # Up/down controls X-axis rotation
+                                angle_y = np.radians(delta_pos[0] * 0.5)  # Left/right controls Y-axis rotation
+                                
+                                # Define rotation matrices around the X and Y axes
+                                rotation_x = np.array([
+                                    [1, 0, 0],
+                                    [0, np.cos(angle_x), -np.sin(angle_x)],
+                                    [0, np.sin(angle_x), np.cos(angle_x)]
+                                ])
+                                
+                                rotation_y = np.array([
+                                    [np.cos(angle_y), 0, np.sin(angle_y)],
+                                    [0, 1, 0],
+                                    [-np.sin(angle_y), 0, np.cos(angle_y)]
+                                ])
+                                
+                                # Update the overall rotation matrix by combining new rotations
+                                active_area.rotation_matrix = rotation_y @ rotation_x @ active_area.rotation_matrix
+                                active_area.invalidate()
+                                last_mouse_pos = current_mouse_pos    
+        
+                        elif event.type == pygame.MOUSEBUTTONUP:
+                            if event.button == 1:  # Left mouse button released
+                                dragging_rotate = False
+                            if event.button == 2:  # Middle mouse button
+                                dragging_all = False
+                            if event.button == 3:  # Left mouse button
+                                active_area.dragging_curve = None  # Stop dragging
+            
+            # Redraw only the areas that changed and push just their rects to the display
+            areas = list(self.Areas.values())
+            full_redraw = self.layout_changed
+            if full_redraw:
+                self.layout_changed = False
+                self.screen.set_clip(None)
+                self.screen.fill((255, 255, 255))  # Clear the screen
+                for area in areas:
+                    area.invalidate()
+                    
+            dirty_areas = [area for area in areas if area.needs_redraw()]
+            for area in dirty_areas:
+                area.draw()  # Separate function for each Area
+                
+            if full_redraw:
+                pygame.display.flip()
+            elif dirty_areas:
+                pygame.display.update([area.get_rect() for area in dirty_areas])
+                
+            clock.tick(self.max_fps if dirty_areas else self.idle_fps)
+
+        pygame.quit()
+
+        if not self.running:
+            print("Closing Tkinter window from Pygame...")
+            self.tkinter_instance.quit()  # Close Tkinter window
+                
+    def handle_mouse_button_up(self):
+        pass
+
+denominators = Calculate_denominators()
+aDim   = 100000
+label_pad   = 50  # pixels
+label_cache = LabelCache()
+axis   = funs.LineBunch([([-aDim, 0], [aDim, 0]), ([0, -aDim], [0, aDim])], 2)
+axis3d = funs.LineBunch3d(aDim)
+
+def main():
+    # The interactive program, started by run.py
+    from tks import TkinterWindow  # not needed for headless rendering
+    
+    # Heavy ODE solves go to other processes
+    funs.ODECurve.backend = compute.ProcessBackend()
+    # Slow solves are kept on disk, a curve opened again in a later session is read back
+    funs.Curve.result_store = cache.TrajectoryStore('trajectories')
+    
+    pygame_instance = PygameWindow(None, denominators, [axis], 1000, 1000, axis3dLines = [axis3d]) 
+    tkinter_instance = TkinterWindow(pygame_instance, 600, 1000, 1000)
+
+    pygame_instance.tkinter_instance = tkinter_instance
+
+    # Start the Pygame window in a separate thread
+    pygame_thread = threading.Thread(target=pygame_instance.start)
+    pygame_thread.start()
+
+    # Start the Tkinter window in the main thread (important!)
+    tkinter_instance.mainloop()
+
+    # Ensure the Pygame thread joins properly
+    pygame_thread.join()
+    compute.scheduler.shutdown()
+    compute.precomputer.shutdown()
+    funs.ODECurve.backend.shutdown()